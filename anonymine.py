@@ -316,6 +316,7 @@ class curses_game():
         self.window_start = [0, 0]      # Item assignment
         self.cursor = (0, 0)
         self.attention_mode = False
+        self.hint_mode = False
         # Initialize curses.
         self.window = curses.initscr()
         curses.cbreak()
@@ -499,6 +500,18 @@ class curses_game():
         
         if engine.game_status == 'play-game':
             chunks.append("Flags left: {0}".format(engine.field.flags_left))
+            if self.hint_mode and engine.field.get(self.cursor) is None:
+                # Wrong flags or a field without flag count may give None.
+                probability = None
+                probabilities = engine.solver.probabilities()
+                if probabilities is not None:
+                    probability = probabilities[self.cursor]
+                if probability is None:
+                    chunks.append("Mine: ?")
+                else:
+                    chunks.append("Mine: {0}%".format(
+                        int(100 * probability + 0.5)
+                    ))
         
         msg = '  '.join(chunks)
         if len(msg) + 4 <= self.width:
@@ -533,6 +546,11 @@ class curses_game():
         else:
             direction_keys = self.direction_keys['square']
         look_for = ['reveal','flag','toggle-attention','quit']+direction_keys
+        # Old cursescfg files may not have the newer keys.
+        if 'toggle-hint' in self.cfg['curses-input']:
+            look_for.append('toggle-hint')
+        # Let the engine get a head start where the cursor is.
+        engine.speculate(self.cursor)
         # Receive input from player.
         ch = self.window.getch()
         # Interpret.
@@ -563,7 +581,15 @@ class curses_game():
         elif command == 'reveal':
             pre_game = engine.game_status == 'pre-game'
             if pre_game:
-                self.message('Initializing field...   This may take a while.')
+                if engine.wait is None:
+                    self.message(
+                        'Initializing field...   This may take a while.'
+                    )
+                else:
+                    self.message(
+                        'Initializing field...   Expected wait: {0:.1f} s'
+                        .format(engine.wait)
+                    )
                 if self.curses_voodoo:
                     curses.reset_shell_mode() #BUG: see comments above __init__
             engine.reveal(self.cursor)
@@ -576,6 +602,8 @@ class curses_game():
             self.travel(engine.field, command)
         elif command == 'toggle-attention':
             self.attention_mode = not self.attention_mode
+        elif command == 'toggle-hint':
+            self.hint_mode = not self.hint_mode
         elif command == 'quit':     # Needed on Windows
             raise KeyboardInterrupt
         elif ch != curses.KEY_MOUSE:
@@ -1107,6 +1135,8 @@ def arg_input(default):
     are required for `default`, or none of them.  It may also contain
     'enginecfg' and/or 'cursescfg' for specifying configuration files
     that are not in the ordinary search path.
+    'fill-bank' is a list of paramstrings for `fill_bank`.
+    'replay' is a replay string for `play_game`.
     
     The program will exit if bogus parameters are given.
     
@@ -1172,6 +1202,22 @@ without guessing and supports three different game types:
             )
         )
     )
+    parser.add_argument(
+        '--fill-bank', dest='fillbank', nargs='+', metavar='PARAMS',
+        help=(
+            'Make solvable fields in advance for each PARAMS, ex. '
+            '80@20x20-moore\n'
+            'and exit.  The bank is configured in enginecfg.'
+        )
+    )
+    parser.add_argument(
+        '--replay', dest='replay', metavar='REPLAY',
+        help=(
+            'Play the field of an earlier game again.  REPLAY is shown\n'
+            'after the game and recorded in the highscores.  It sets\n'
+            'the size, mines and gametype.'
+        )
+    )
     # Dimensions and minecount.
     parser.add_argument(
         '-s', '--size', dest='size',
@@ -1322,6 +1368,24 @@ without guessing and supports three different game types:
         params['cursescfg'] = args.cursescfg
     if args.enginecfg:
         params['enginecfg'] = args.enginecfg
+    if args.fillbank:
+        params['fill-bank'] = args.fillbank
+    # Replay, overrides the parameters.
+    if args.replay:
+        user_input_required = False
+        try:
+            paramstring = game_engine.parse_replay(args.replay)[0]
+            (
+                params['mines'], params['width'], params['height'],
+                params['gametype']
+            ) = game_engine.parse_paramstring(
+                paramstring.replace('+losable', '')
+            )
+            params['guessless'] = not paramstring.endswith('+losable')
+            params['replay'] = args.replay
+        except ValueError as e:
+            error = True
+            output(sys.stderr, 'Error with "--replay": {0}\n'.format(e))
     # Deal with error and user_input_required.
     if error:
         sys.exit(1)
@@ -1501,6 +1565,10 @@ def play_game(parameters):
                         game engine.
         'cursescfg'     The path to the configuration file for key
                         bindings and textics customisation.
+    
+    It MAY contain:
+        'replay'        A string from `game_engine.format_replay`,
+                        play that field again.
     '''
     if isinstance(parameters['mines'], float):
         area = parameters['width'] * parameters['height']
@@ -1525,6 +1593,10 @@ def play_game(parameters):
         return
     interface.leave()
     
+    if engine.replay is not None:
+        output(sys.stdout,
+            '\nReplay this field with --replay {0}\n'.format(engine.replay)
+        )
     if parameters['insult']:
         if win:
             output(sys.stdout,
@@ -1537,6 +1609,24 @@ def play_game(parameters):
     highscores_display(title, headers, rows, parameters['cursescfg'])
 
 
+def fill_bank(paramstrings, enginecfg):
+    '''Fill the bank of solvable fields for `paramstrings`.
+    
+    `paramstrings` is a list of strings like "80@20x20-moore", see
+    `game_engine.fill_bank`.  Exits the program on errors.
+    '''
+    def progress(paramstring, count, size):
+        output(sys.stdout, '{0}: {1}/{2}\n'.format(paramstring, count, size))
+    try:
+        game_engine.fill_bank(enginecfg, paramstrings, progress)
+    except ValueError as e:
+        output(sys.stderr, 'Error with "--fill-bank": {0}\n'.format(e))
+        sys.exit(1)
+    except EnvironmentError as e:
+        output(sys.stderr, 'Cannot use the bank: {0}\n'.format(e))
+        sys.exit(1)
+
+
 def main():
     '''42
     
@@ -1597,6 +1687,10 @@ def main():
     if error:
         sys.exit(1)
     
+    if 'fill-bank' in parameters:
+        fill_bank(parameters['fill-bank'], cfgfiles['enginecfg'])
+        sys.exit(0)
+    
     if interactive:
         output(sys.stdout,GAME_CRAPTEXT)
         output(sys.stdout,
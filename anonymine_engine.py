@@ -46,9 +46,12 @@ import os
 import time
 import signal
 import errno
+import select
 import sys
 import getpass
 import locale
+import stat
+import traceback
 
 try:
     import math
@@ -58,10 +61,16 @@ except:
         def ceil(self, x): return int(x)
     math = mathclass()
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None    # No locking of the shared files.
+
 
 # Allow module names to be changed later.
 import anonymine_solver as solver
 import anonymine_fields as fields
+import anonymine_rng as rng
 
 
 class security_alert(Exception):
@@ -114,6 +123,20 @@ class hiscores():
         `add_entry` method set their fields to an empty string.
     
     
+    Replays
+    -------
+    
+        The `format_replay` strings of the fields are kept in a
+        separate file, the highscores file with ".replays" appended,
+        so that the highscores file stays readable for older versions.
+    
+        line = <time> ":" <replay>
+        
+        `time` is the `time` field of the entry in the highscores
+        file.  Lines for entries that have dropped off the lists are
+        removed when the highscores file is written.
+    
+    
     paramstring
     -----------
     
@@ -139,7 +162,8 @@ class hiscores():
         return an `str` instance on both Python versions.
         
     '''
-    def __init__(self, cfg, paramstring, delta_time, mines_left=0):
+    def __init__(self, cfg, paramstring, delta_time, mines_left=0,
+                 replay=None):
         '''
         Create a `hiscores` object for the played game.
         This object is created by `game_engine.play_game` after
@@ -161,6 +185,8 @@ class hiscores():
         
         `mines_left` (integer) is only used if the game was lost.
         
+        `replay` is the `format_replay` string of the field or None.
+        
         If the game was lost, either set `delta_time` to None
         (to prevent someone from entering the winners' highscores),
         or prepend "lost/" to `paramstring`.  The latter option
@@ -173,8 +199,10 @@ class hiscores():
             self.delta_time = str(delta_time)
         self.win_time = str(time.time())
         self.mines_left = mines_left
+        self.replay = replay
         
         self.hiscorefile = cfg['file']
+        self.replayfile = cfg['file'] + '.replays'
         self.maxsize = cfg['maxsize']
         self.n_entries = cfg['entries']
         self.use_user = cfg['use-user']
@@ -217,9 +245,41 @@ class hiscores():
                 return
             f.write(content)
             f.close()
+            self._store_replays()
         else:
             self.display_caption = "New highscore's filesize too large"
     
+    def _store_replays(self):
+        '''
+        Add the replay of this game to `self.replayfile` and remove
+        the replays of entries that are no longer in `self.hiscores`.
+        Errors are ignored, the replays are not important.
+        '''
+        replays = {}
+        try:
+            f = open(self.replayfile, 'rb')
+            for line in f.read().decode('ascii').split('\n'):
+                if ':' in line:
+                    win_time, replay = line.split(':', 1)
+                    replays[win_time] = replay
+            f.close()
+        except (IOError, UnicodeDecodeError):
+            pass
+        if self.replay is not None:
+            replays[self.win_time] = self.replay
+        content = ''
+        for entry in self.hiscores:
+            if entry[2] in replays:
+                content += '{0}:{1}\n'.format(entry[2], replays[entry[2]])
+        content = content.encode('ascii')
+        if len(content) <= self.maxsize:
+            try:
+                f = open(self.replayfile, 'wb')
+                f.write(content)
+                f.close()
+            except IOError:
+                pass
+    
     def _sort(self, sublist, game_lost):
         '''
         Sort a sublist.
@@ -451,6 +511,1554 @@ class hiscores():
         return self.display_caption, headers, rows
 
 
+def new_field(dimensions, gametype):
+    '''
+    Return an empty field (with flagcount) of `gametype`: 'moore',
+    'hex' or 'neumann'.
+    '''
+    width, height = dimensions
+    if gametype == 'hex':
+        return fields.hexagonal_field(width, height, True)
+    else:
+        return fields.generic_field(
+            [width, height],
+            gametype == 'moore',
+            True    # Flagcount
+        )
+
+
+def new_solver(cfg):
+    '''
+    Return the solver selected by `cfg` (enginecfg), without a field.
+    '''
+    # The SAT backend is faster but doesn't collect difficulty
+    # statistics.
+    if cfg['init-field'].get('backend', 'rules') == 'sat':
+        return solver.sat_solver()
+    s = solver.solver()
+    # Windows solved in earlier games.
+    patternfile = cfg['init-field'].get('patterns', None)
+    if patternfile is not None:
+        s.patterns = load_patterns(patternfile)
+    return s
+
+
+def load_patterns(path):
+    '''
+    Return a `solver.pattern_db` with the entries from the player's
+    file in the directory `path` (see `user_file`).  The database is
+    empty if the file is missing, refused or unreadable.
+    
+    The solver trusts what it recalls (see `solver.plausible`), so
+    every player has their own database, like in the `board_bank`.
+    '''
+    db = solver.pattern_db()
+    try:
+        f = os.fdopen(open_shared(user_file(path, 'patterns'), write=False))
+    except OSError:
+        return db
+    try:
+        db.load(f)
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        f.close()
+    return db
+
+
+def save_patterns(db, path):
+    '''
+    Merge the new entries of the `solver.pattern_db` `db` into the
+    player's file in the directory `path`, see `load_patterns`.  The
+    file is rewritten in place while it's locked by `open_shared`.
+    Errors are ignored, the database is only a cache.
+    '''
+    if not db.added:
+        return
+    try:
+        if not os.path.isdir(path):
+            os.mkdir(path)
+        f = os.fdopen(open_shared(user_file(path, 'patterns'), 384), 'r+')
+    except OSError:
+        return
+    held = hold_signals()
+    try:
+        db.save(f)
+    except (IOError, OSError, ValueError):
+        pass
+    finally:
+        f.close()
+        release_signals(held)
+
+
+def safe_cells(field, startpoint):
+    '''
+    The cells of `field` that may be mines:  The startpoint and its
+    neighbours MUST NOT be mines.
+    '''
+    safe = field.get_neighbours(startpoint) + [startpoint]
+    return list(filter(
+        lambda x: x not in safe,
+        field.all_cells()
+    ))
+
+
+def regenerate_mines(field, s, n_mines, startpoint, cfg, origin,
+                     strategy=None):
+    '''
+    Make the field from `guessless_mines` or `game_engine.init_field`
+    again from its origin, (seed, stream, attempt), see
+    `anonymine_rng`.
+    
+    `s` is None for a field that doesn't have to be solvable (not
+    guessless).  `strategy` is the strategy the field was made with,
+    see `guessless_mines`.  The mines of a 'repair' field (see `repair_mines`)
+    depend on where the solver `s` got stuck, they are the same only
+    if `s` is configured the same way and 'maxtime' is None.
+    '''
+    seed, index, attempt = origin
+    stream = rng.stream(seed, index)
+    stream.attempt = attempt - 1
+    if strategy is None:
+        strategy = cfg['init-field'].get('strategy', 'reject')
+    if s is not None and strategy == 'repair':
+        return repair_mines(field, s, n_mines, startpoint, cfg, stream)[0]
+    return rng.sample(stream.next(), safe_cells(field, startpoint), n_mines)
+
+
+def format_replay(paramstring, origin, cell, symmetry, strategy):
+    '''
+    Return the string that `game_engine` (replay=) needs to make a
+    field again:
+    
+        <paramstring>"/"<seed>","<stream>","<attempt>"/"<x>","<y>"/"
+        <symmetry>"/"<strategy>
+    
+    The field was made from `origin` (see `regenerate_mines`) with
+    `strategy` for the startpoint `cell`, and then mapped with
+    `game_engine.symmetries()[symmetry]`.
+    '''
+    return '{0}/{1}/{2},{3}/{4}/{5}'.format(
+        paramstring, rng.format_origin(origin), cell[0], cell[1],
+        symmetry, strategy
+    )
+
+
+def parse_replay(string):
+    '''
+    Return (paramstring, origin, cell, symmetry, strategy) from a
+    `format_replay` string.  Raises ValueError.
+    '''
+    try:
+        paramstring, origin, cell, symmetry, strategy = string.split('/')
+        origin = rng.parse_origin(origin)
+        x, y = map(int, cell.split(','))
+        symmetry = int(symmetry)
+    except ValueError:
+        raise ValueError('Bad replay: ' + string)
+    parse_paramstring(paramstring.replace('+losable', ''))
+    if strategy not in ('reject', 'repair'):
+        raise ValueError('Unknown strategy: ' + strategy)
+    return paramstring, origin, (x, y), symmetry, strategy
+
+
+def guessless_mines(field, s, n_mines, startpoint, cfg, stream=None,
+                    strategy=None):
+    '''
+    Try random fields until the solver `s` can solve one from
+    `startpoint`.  `field` is cleared and used for the attempts.
+    
+    The fields are from the `anonymine_rng.stream` `stream`, (a new
+    seed if None).  `stream.origin()` is the origin of the field that
+    was found, see `regenerate_mines`.
+    
+    Uses `repair_mines` instead if `strategy` is 'repair'.  It's
+    cfg['init-field']['strategy'] if None ('auto' is 'reject' here,
+    see `game_engine.choose`).
+    
+    Returns (mines, rejections), see `game_engine.init_field2`.
+    '''
+    if stream is None:
+        stream = rng.stream(rng.new_seed(), 0)
+    if strategy is None:
+        strategy = cfg['init-field'].get('strategy', 'reject')
+    if strategy == 'repair':
+        return repair_mines(field, s, n_mines, startpoint, cfg, stream)
+    cells = safe_cells(field, startpoint)
+    maxtime = cfg['init-field'].get('maxtime', None)
+    maxnodes = cfg['init-field'].get('maxnodes', None)
+    rejections = {'solver': 0}
+    for name, reject in solver.reject_filters:
+        rejections[name] = 0
+    s.field = field
+    solved = False
+    while not solved:
+        # Choose n_mines randomly selected mines.
+        mines = rng.sample(stream.next(), cells, n_mines)
+        field.clear()
+        field.fill(mines)
+        field.reveal(startpoint)
+        # Cheap tests first.
+        mine_set = set(mines)
+        rejected = False
+        for name, reject in solver.reject_filters:
+            if reject(field, mine_set):
+                rejections[name] += 1
+                rejected = True
+                break
+        if rejected:
+            continue
+        rejections['solver'] += 1
+        # Give up on fields that take too long, a new one is
+        # probably faster.  (solve returns None)
+        deadline = None
+        if maxtime is not None:
+            deadline = time.time() + maxtime
+        solved = s.solve(deadline, maxnodes)[0]
+    if s.patterns is not None:
+        save_patterns(s.patterns, cfg['init-field']['patterns'])
+    return mines, rejections
+
+
+def repair_mines(field, s, n_mines, startpoint, cfg, stream=None):
+    '''
+    Like `guessless_mines`, but when the solver gets stuck, a mine
+    next to where it got stuck is moved to another cell there instead
+    of throwing the whole field away.
+    
+    The solver continues from what it knew (`s.knowledge`) with the
+    numbers around the moved mine updated.  That knowledge was partly
+    deduced from the old numbers, so a field that seems solvable is
+    solved once more from the beginning before it is accepted (and
+    if it isn't, the repairs continue from where that got stuck).
+    
+    After cfg['init-field']['repairs'] (default: the number of mines)
+    moves without success, a new random field is tried.  The moves
+    are chosen with the random numbers of the field's attempt.
+    
+    `rejections` also counts the moves ('repair').
+    '''
+    if stream is None:
+        stream = rng.stream(rng.new_seed(), 0)
+    cells = safe_cells(field, startpoint)
+    maxtime = cfg['init-field'].get('maxtime', None)
+    maxnodes = cfg['init-field'].get('maxnodes', None)
+    max_repairs = cfg['init-field'].get('repairs', n_mines)
+    rejections = {'solver': 0, 'repair': 0}
+    for name, reject in solver.reject_filters:
+        rejections[name] = 0
+    def solve(known=None):
+        # Full solve if `known` is None, otherwise continue from it.
+        rejections['solver'] += 1
+        deadline = None
+        if maxtime is not None:
+            deadline = time.time() + maxtime
+        if known is None:
+            s.field = field
+            return s.solve(deadline, maxnodes)[0]
+        s.field = known
+        s.mutate_field = True
+        try:
+            for step in s.steps(deadline, maxnodes):
+                pass
+        finally:
+            s.mutate_field = False
+            s.field = field
+        return s.success
+    while True:
+        rand = stream.next()
+        mines = rng.sample(rand, cells, n_mines)
+        field.clear()
+        field.fill(mines)
+        field.reveal(startpoint)
+        # Cheap tests first.
+        mine_set = set(mines)
+        rejected = False
+        for name, reject in solver.reject_filters:
+            if reject(field, mine_set):
+                rejections[name] += 1
+                rejected = True
+                break
+        if rejected:
+            continue
+        if solve():
+            break
+        known = s.knowledge
+        for repair in range(max_repairs):
+            # Where it's stuck:  The unknown cells next to the known
+            # numbers.  Move a mine from there to an unknown cell next
+            # to it (further away from the known numbers).
+            stuck = set()
+            for cell in known.all_cells():
+                value = known.get(cell)
+                if value is None or value == 'F':
+                    continue
+                for neighbour in field.get_neighbours(cell):
+                    if known.get(neighbour) is None:
+                        stuck.add(neighbour)
+            around = set()
+            for cell in stuck:
+                for neighbour in field.get_neighbours(cell):
+                    if known.get(neighbour) is None:
+                        around.add(neighbour)
+            around -= stuck
+            mine_set = set(mines)
+            movable = [cell for cell in stuck if cell in mine_set]
+            free = [cell for cell in around if cell not in mine_set]
+            if not free:
+                free = [cell for cell in stuck if cell not in mine_set]
+            if not movable or not free:
+                break
+            # (Sorted:  The order of a set is not the same everywhere.)
+            old = rng.choice(rand, sorted(movable))
+            new = rng.choice(rand, sorted(free))
+            mines[mines.index(old)] = new
+            rejections['repair'] += 1
+            field.clear()
+            field.fill(mines)
+            field.reveal(startpoint)
+            # The known numbers around the move have changed.
+            for cell in field.get_neighbours(old) + field.get_neighbours(new):
+                value = known.get(cell)
+                if value is not None and value != 'F':
+                    known.numbers[known.index[cell]] = field.peek(cell)[1]
+            if solve(known):
+                if solve():
+                    break
+                known = s.knowledge
+        else:
+            continue
+        if s.success:
+            break
+    if s.patterns is not None:
+        save_patterns(s.patterns, cfg['init-field']['patterns'])
+    return mines, rejections
+
+
+def scan_mines(field, s, n_mines, cfg, stream=None):
+    '''
+    Try random fields until the solver `s` can solve one from at least
+    one of its openings (see `anonymine_solver.openings`).  `field` is
+    cleared and used for the attempts.
+    
+    Every opening of a field is tried, starting from a snapshot of
+    the empty `anonymine_solver.knowledge` of the field.  A run stops
+    as soon as it has revealed an opening that has already been
+    solved, the rest of the way is known to be solvable.
+    
+    Returns (mines, startpoints, rejections) where `startpoints` are
+    all the cells the field can be solved from.  `rejections` counts
+    openings, see `guessless_mines` (also for `stream`).
+    '''
+    if stream is None:
+        stream = rng.stream(rng.new_seed(), 0)
+    cells = field.all_cells()
+    maxtime = cfg['init-field'].get('maxtime', None)
+    maxnodes = cfg['init-field'].get('maxnodes', None)
+    rejections = {'solver': 0}
+    for name, reject in solver.reject_filters:
+        rejections[name] = 0
+    mutate_field = s.mutate_field
+    s.mutate_field = True   # Solve the snapshots.
+    try:
+        while True:
+            mines = rng.sample(stream.next(), cells, n_mines)
+            field.clear()
+            field.fill(mines)
+            mine_set = set(mines)
+            known = solver.knowledge(field)
+            empty = known.snapshot()
+            solved = []     # One cell of each solvable opening.
+            startpoints = []
+            for region in solver.openings(field):
+                known.restore(empty)
+                known.reveal(region[0])
+                rejected = False
+                for name, reject in solver.reject_filters:
+                    if reject(known, mine_set):
+                        rejections[name] += 1
+                        rejected = True
+                        break
+                if rejected:
+                    continue
+                rejections['solver'] += 1
+                deadline = None
+                if maxtime is not None:
+                    deadline = time.time() + maxtime
+                s.field = known
+                steps = s.steps(deadline, maxnodes)
+                success = False
+                for step in steps:
+                    for cell in solved:
+                        if known.get(cell) is not None:
+                            success = True
+                            break
+                    if success:
+                        break
+                steps.close()
+                if success or s.success:
+                    solved.append(region[0])
+                    startpoints.extend(region)
+            if startpoints:
+                break
+    finally:
+        s.mutate_field = mutate_field
+        s.field = field
+    if s.patterns is not None:
+        save_patterns(s.patterns, cfg['init-field']['patterns'])
+    return mines, startpoints, rejections
+
+
+def log_error(cfg, what):
+    '''
+    Append `what` (string) and the traceback of the exception that is
+    being handled to cfg['init-field']['log'], or write them to stderr
+    if there is no log.  For errors that must not stop a process.
+    '''
+    message = '{0} {1}: {2}\n{3}'.format(
+        time.ctime(), os.getpid(), what, traceback.format_exc()
+    )
+    try:
+        path = cfg['init-field'].get('log', None)
+        if path is None:
+            sys.stderr.write(message)
+        else:
+            f = open(path, 'a')
+            f.write(message)
+            f.close()
+    except EnvironmentError:
+        pass
+
+
+class cancelled(Exception):
+    '''Raised in a `field_workers` process when its job is cancelled.'''
+    pass
+
+
+def read_some(fd):
+    '''`os.read` that retries when interrupted by a signal.'''
+    while True:
+        try:
+            return os.read(fd, 65536)
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+
+def write_all(fd, data):
+    '''`os.write` all of `data`.'''
+    while data:
+        try:
+            data = data[os.write(fd, data):]
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+
+
+def pack_mines(field, mines):
+    '''
+    Return `mines` as a bitmap (bytes), one bit for each cell in the
+    order of `field.all_cells()`.
+    '''
+    cells = field.all_cells()
+    mine_set = set(map(tuple, mines))
+    bits = bytearray((len(cells) + 7) // 8)
+    for index, cell in enumerate(cells):
+        if cell in mine_set:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bytes(bits)
+
+
+def unpack_mines(field, bitmap):
+    '''The mines of a bitmap from `pack_mines`.'''
+    bits = bytearray(bitmap)
+    mines = []
+    for index, cell in enumerate(field.all_cells()):
+        if bits[index >> 3] >> (index & 7) & 1:
+            mines.append(cell)
+    return mines
+
+
+def encode_answer(job, field, mines, rejections, origin):
+    '''
+    The message a process that found a solvable field sends over its
+    pipe:
+        "job rejections origin length\n" bitmap
+    `rejections` is "name=count,...", `origin` is "seed,stream,attempt"
+    (see `anonymine_rng`) and `bitmap` is `length` bytes from
+    `pack_mines`.
+    '''
+    bitmap = pack_mines(field, mines)
+    header = '{0} {1} {2} {3}\n'.format(
+        job,
+        ','.join([
+            '{0}={1}'.format(name, rejections[name]) for name in rejections
+        ]),
+        rng.format_origin(origin),
+        len(bitmap),
+    )
+    return header.encode('ascii') + bitmap
+
+
+def encode_deposited(job):
+    '''
+    The message a worker sends when it is done with the deposit `job`
+    (the field is in the bank, or it wasn't made):
+        "job - - 0\n"
+    '''
+    return '{0} - - 0\n'.format(job).encode('ascii')
+
+
+def decode_answer(buffer):
+    '''
+    Split the first message from `encode_answer` off `buffer`.
+    
+    Returns (job, rejections, origin, bitmap, rest) or None if the
+    message is incomplete.  The message from `encode_deposited` has
+    no rejections, origin or bitmap ({}, None and b'').
+    '''
+    if b'\n' not in buffer:
+        return None
+    header, rest = buffer.split(b'\n', 1)
+    job, items, origin, length = header.decode('ascii').split(' ')
+    if origin == '-':
+        return int(job), {}, None, b'', rest
+    length = int(length)
+    if len(rest) < length:
+        return None
+    rejections = {}
+    for item in filter(None, items.split(',')):
+        name, count = item.split('=')
+        rejections[name] = int(count)
+    return (
+        int(job), rejections, rng.parse_origin(origin),
+        rest[:length], rest[length:]
+    )
+
+
+def read_answers(readers, dead, answers, timeout=None):
+    '''
+    Read what the `readers` have sent, waiting at most `timeout`
+    seconds (None: until one of them sends something).  `readers` is
+    a list of [pid, fd, buffer, ...] for processes that send messages
+    from `encode_answer`.  `dead(reader)` is called for the readers
+    whose pipes are closed, it must remove them from the list.
+    
+    The complete answers are put in the dictionary `answers` as
+    job: (rejections, bitmap, origin).
+    '''
+    try:
+        readable = select.select(
+            [reader[1] for reader in readers], [], [], timeout
+        )[0]
+    except select.error as e:
+        if e.args[0] == errno.EINTR:
+            return
+        raise
+    for reader in list(readers):
+        if reader[1] not in readable:
+            continue
+        data = read_some(reader[1])
+        if not data:
+            dead(reader)
+            continue
+        reader[2] += data
+        while True:
+            answer = decode_answer(reader[2])
+            if answer is None:
+                break
+            reader[2] = answer[4]
+            answers[answer[0]] = answer[1], answer[3], answer[2]
+
+
+def first_answer(readers, job, dead, answers=None):
+    '''
+    Wait for the first answer to `job` from the `readers`, see
+    `read_answers`.  Answers to other jobs are put in `answers`.
+    
+    Returns (rejections, bitmap, origin).  Raises OSError if there are
+    no readers left.
+    '''
+    if answers is None:
+        answers = {}
+    while job not in answers:
+        if not readers:
+            raise OSError(errno.ECHILD, 'No process found a field')
+        read_answers(readers, dead, answers)
+    return answers.pop(job)
+
+
+def hold_signals():
+    '''
+    Hold back SIGUSR1 and SIGTERM until `release_signals`, so that a
+    cancelled `field_workers` process or a killed forked process (see
+    `game_engine.init_field2`) doesn't stop in the middle of writing
+    a shared file.
+    
+        held = hold_signals()
+        try:
+            ...
+        finally:
+            release_signals(held)
+    '''
+    held = ([], {})
+    def hold(signum, frame):
+        held[0].append(signum)
+    for name in ('SIGUSR1', 'SIGTERM'):
+        if name in dir(signal):
+            signum = getattr(signal, name)
+            handler = signal.signal(signum, hold)
+            if handler is None:
+                handler = signal.SIG_DFL
+            held[1][signum] = handler
+    return held
+
+
+def release_signals(held):
+    '''Restore the handlers and deliver the signals that were held.'''
+    signals, handlers = held
+    for signum in handlers:
+        signal.signal(signum, handlers[signum])
+    for signum in signals:
+        os.kill(os.getpid(), signum)
+
+
+def user_file(directory, name):
+    '''
+    Return the path to the player's own file `name` in `directory`,
+    which may be shared with the other players:  "<name>.<uid>".
+    '''
+    if 'geteuid' in dir(os):
+        user = os.geteuid()
+    else:
+        user = 'all'
+    return os.path.join(directory, '{0}.{1}'.format(name, user))
+
+
+def open_shared(path, create=None, write=True):
+    '''
+    Open a file that may be in a directory other players can write
+    to, and lock it (`fcntl.flock` where it exists).  Returns the
+    file descriptor.
+    
+    `create` is the mode of the file if it shall be created if it
+    doesn't exist, otherwise it must exist.  Symlinks are not
+    followed, and the file must be a regular file with only one link,
+    owned by this user or by the owner of the directory.  Otherwise
+    OSError is raised, like for other errors.
+    '''
+    flags = getattr(os, 'O_NOFOLLOW', 0)
+    if write:
+        flags |= os.O_RDWR
+    else:
+        flags |= os.O_RDONLY
+    if create is not None:
+        flags |= os.O_CREAT
+    fd = os.open(path, flags, create or 0)
+    try:
+        info = os.fstat(fd)
+        owners = [os.stat(os.path.dirname(os.path.abspath(path))).st_uid]
+        if 'geteuid' in dir(os):
+            owners.append(os.geteuid())
+        if (
+            not stat.S_ISREG(info.st_mode) or info.st_nlink != 1 or
+            ('geteuid' in dir(os) and info.st_uid not in owners)
+        ):
+            raise OSError(errno.EPERM, 'Refusing to use the file', path)
+        if fcntl is not None:
+            if write:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+    except:
+        os.close(fd)
+        raise
+    return fd
+
+
+class board_bank():
+    '''
+    Solvable fields stored on disk, so the first click doesn't have to
+    wait for one to be found.  Every player has one file for each
+    paramstring (eg. "80@20x20-moore", see `game_engine.paramstring`)
+    in the directory `path`:  "<paramstring>.<uid>".  At most `size`
+    fields are kept for each.
+    
+    The directory may be writable by everyone (with the sticky bit),
+    the files are opened with `open_shared` and only the player can
+    write to them.  The fields are checked before they are used
+    anyway, see `game_engine.init_field2`.
+    
+    A file is a sequence of records of two bitmaps from `pack_mines`:
+    the startpoints the field has been solved from, followed by the
+    mines.  The order of the records doesn't matter, `take` moves the
+    last record into the place of the one it took.
+    
+    The files are locked with `fcntl.flock` where it exists.  Errors
+    are raised as IOError/OSError.
+    '''
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+    
+    def record_size(self, field):
+        '''(Internal)  Length of a record for `field`.'''
+        return 2 * ((len(field.all_cells()) + 7) // 8)
+    
+    def filename(self, paramstring):
+        '''(Internal)  The path to the player's file.'''
+        return user_file(self.path, paramstring)
+    
+    def open(self, paramstring):
+        '''(Internal)  Return a locked file descriptor.'''
+        if not os.path.isdir(self.path):
+            os.mkdir(self.path)
+        return open_shared(
+            self.filename(paramstring),
+            384     # 0600, the other players have their own.
+        )
+    
+    def count(self, paramstring, field):
+        '''Number of fields banked for `paramstring`.'''
+        try:
+            length = os.lstat(self.filename(paramstring)).st_size
+        except OSError:
+            return 0
+        return length // self.record_size(field)
+    
+    def full(self, paramstring, field):
+        '''True if no more fields for `paramstring` would be kept.'''
+        return self.count(paramstring, field) >= self.size
+    
+    def add(self, paramstring, field, mines, startpoints):
+        '''
+        Bank `mines`, solvable from all of `startpoints`, unless the
+        bank for `paramstring` is full.
+        '''
+        size = self.record_size(field)
+        fd = self.open(paramstring)
+        held = hold_signals()
+        try:
+            end = os.lseek(fd, 0, 2)
+            if end // size >= self.size:
+                return
+            os.lseek(fd, end - end % size, 0)
+            write_all(
+                fd,
+                pack_mines(field, startpoints) + pack_mines(field, mines)
+            )
+        finally:
+            os.close(fd)
+            release_signals(held)
+    
+    def take(self, paramstring, field, startpoints):
+        '''
+        Remove a banked field that is solvable from one of
+        `startpoints`, the earlier ones are preferred.
+        
+        Returns (mines, index) where `startpoints[index]` is the
+        startpoint the field was solved from, or None.
+        '''
+        size = self.record_size(field)
+        position = {}
+        for index, cell in enumerate(field.all_cells()):
+            position[cell] = index
+        wanted = [position[tuple(cell)] for cell in startpoints]
+        fd = self.open(paramstring)
+        held = hold_signals()
+        try:
+            data = b''
+            while True:
+                chunk = read_some(fd)
+                if not chunk:
+                    break
+                data += chunk
+            data = bytearray(data[:len(data) - len(data) % size])
+            best = None     # (rank, offset)
+            for offset in range(0, len(data), size):
+                for rank, index in enumerate(wanted):
+                    if best is not None and rank >= best[0]:
+                        break
+                    if data[offset + (index >> 3)] >> (index & 7) & 1:
+                        best = (rank, offset)
+                        break
+                if best is not None and best[0] == 0:
+                    break
+            if best is None:
+                return None
+            rank, offset = best
+            mines = unpack_mines(
+                field,
+                bytes(data[offset + size // 2:offset + size])
+            )
+            # Fill the hole with the last record.
+            last = len(data) - size
+            if offset != last:
+                os.lseek(fd, offset, 0)
+                write_all(fd, bytes(data[last:]))
+            os.ftruncate(fd, last)
+            return mines, rank
+        finally:
+            os.close(fd)
+            release_signals(held)
+
+
+def new_bank(cfg):
+    '''
+    Return the `board_bank` configured in `cfg` (enginecfg), or None.
+    '''
+    path = cfg['init-field'].get('bank', None)
+    if path is None:
+        return None
+    return board_bank(path, cfg['init-field'].get('bank-size', 16))
+
+
+class generation_stats():
+    '''
+    How long it has taken to make solvable fields, used by
+    `game_engine.choose` to choose how to make the next one.  The
+    file `path` is shared by all players and locked like the
+    `board_bank`.
+    
+    File format
+    -----------
+    
+        One line for each paramstring and strategy, separated by
+        spaces:
+        
+        line = <paramstring> <strategy> <fields> <tries> <seconds>
+        
+        `fields` is the number of solvable fields that have been made,
+        `tries` the number of fields given to the solver and `seconds`
+        the process-seconds it took.  `fields / tries` is the success
+        rate, `seconds / tries` the time per try.
+        
+        Only the process that found the field counts its tries, the
+        others are estimated from it, see `game_engine.record`.
+        
+        When there are more than `limit` fields, all three numbers are
+        halved, so old history counts less.
+    
+    The file is opened with `open_shared`.  Errors are raised as
+    IOError/OSError.
+    '''
+    def __init__(self, path, limit=64):
+        self.path = path
+        self.limit = limit
+    
+    def open(self):
+        '''(Internal)  Return a locked file descriptor.'''
+        # Installed writable for everyone, see `open_shared`.
+        return open_shared(self.path, 420)  # 0644 if created here.
+    
+    def read(self, fd):
+        '''(Internal)  {(paramstring, strategy): [fields, tries, seconds]}'''
+        data = b''
+        while True:
+            chunk = read_some(fd)
+            if not chunk:
+                break
+            data += chunk
+        # Anyone may have written anything, bad lines are ignored.
+        stats = {}
+        for line in data.decode('ascii', 'replace').split('\n'):
+            words = line.split(' ')
+            if len(words) != 5 or words[1] not in ('reject', 'repair'):
+                continue
+            try:
+                fields, tries, seconds = map(float, words[2:])
+            except ValueError:
+                continue
+            # (NaN fails every comparison.)
+            if (
+                0 < fields <= self.limit and fields <= tries < 1e9 and
+                0 <= seconds < 1e9
+            ):
+                stats[(words[0], words[1])] = [fields, tries, seconds]
+        return stats
+    
+    def get(self, paramstring, strategy):
+        '''(fields, tries, seconds) for `paramstring` and `strategy`.'''
+        fd = self.open()
+        try:
+            stats = self.read(fd)
+        finally:
+            os.close(fd)
+        return tuple(stats.get((paramstring, strategy), (0, 0, 0.0)))
+    
+    def add(self, paramstring, strategy, tries, seconds):
+        '''Add one field to the statistics.'''
+        fd = self.open()
+        try:
+            stats = self.read(fd)
+            key = (paramstring, strategy)
+            old = stats.get(key, [0, 0, 0.0])
+            new = [old[0] + 1, old[1] + tries, old[2] + seconds]
+            if new[0] > self.limit:
+                new = [x / 2.0 for x in new]
+            stats[key] = new
+            content = ''
+            for key in sorted(stats):
+                content += '{0} {1} {2} {3} {4}\n'.format(
+                    key[0], key[1],
+                    stats[key][0], stats[key][1], stats[key][2]
+                )
+            os.lseek(fd, 0, 0)
+            os.ftruncate(fd, 0)
+            write_all(fd, content.encode('ascii'))
+        finally:
+            os.close(fd)
+
+
+def new_stats(cfg):
+    '''
+    Return the `generation_stats` configured in `cfg` (enginecfg), or
+    None.
+    '''
+    path = cfg['init-field'].get('stats', None)
+    if path is None:
+        return None
+    return generation_stats(path)
+
+
+def cgroup_cpus():
+    '''
+    Return the number of processors (float) the CPU quota of the
+    cgroup of this process allows, or None if there is no quota (or
+    no cgroups).  The smallest quota of the cgroup and its parents
+    is used.
+    '''
+    def read(path):
+        try:
+            f = open(path)
+        except IOError:
+            return None
+        try:
+            return f.read().split()
+        finally:
+            f.close()
+    quotas = []
+    # cgroup v2:  "quota period" or "max period".
+    directories = ['/sys/fs/cgroup']
+    for line in read('/proc/self/cgroup') or []:
+        if line.startswith('0::/'):
+            path = '/sys/fs/cgroup'
+            for part in filter(None, line[4:].split('/')):
+                path = os.path.join(path, part)
+                directories.append(path)
+    for directory in directories:
+        words = read(os.path.join(directory, 'cpu.max'))
+        if words and words[0] != 'max':
+            quotas.append(float(words[0]) / float(words[1]))
+    # cgroup v1:  The quota is -1 if there is none.
+    quota = read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    period = read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if quota and period and int(quota[0]) > 0:
+        quotas.append(float(quota[0]) / float(period[0]))
+    if not quotas:
+        return None
+    return min(quotas)
+
+
+def count_procs(cfg, busy=0):
+    '''
+    Return the number of processes to use for making a field,
+    cfg['init-field']['procs'] (enginecfg) unless it is 'auto'.
+    
+    'auto' is the number of processors that are free right now:  The
+    processors this process may run on (`os.sched_getaffinity`),
+    no more than the cgroup allows (`cgroup_cpus`), minus the load
+    average.  `busy` processes of our own are already in the load.
+    At least 1 and at most cfg['init-field']['max-procs'] (None for
+    no limit).
+    '''
+    procs = cfg['init-field']['procs']
+    if procs != 'auto':
+        return procs
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        try:
+            import multiprocessing
+            cpus = multiprocessing.cpu_count()
+        except (ImportError, NotImplementedError):
+            cpus = 1
+    quota = cgroup_cpus()
+    if quota is not None:
+        cpus = min(cpus, int(math.ceil(quota)))
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        load = 0.0
+    procs = max(1, int(cpus - max(0.0, load - busy) + 0.5))
+    ceiling = cfg['init-field'].get('max-procs', None)
+    if ceiling is not None:
+        procs = min(procs, ceiling)
+    return procs
+
+
+class field_workers():
+    '''
+    Long lived processes that find solvable fields for
+    `game_engine.init_field2`.
+    
+    Forking `procs` processes on every first click is slow, and each
+    new process starts with cold caches (neighbour lists, solver
+    objects and the pattern database).  The workers are forked once
+    and keep one field and one solver for each game type and size
+    they have been asked about.
+    
+    Every job is sent to every worker, the first answer wins and the
+    other workers are interrupted with SIGUSR1 (which raises
+    `cancelled` in them) and wait for the next job.
+    
+    The workers exit when the pipe to them is closed, ie. when the
+    process that started them exits or calls `stop`.
+    
+    While the player chooses a startpoint, the workers can work on
+    one startpoint each (see `speculate`) and `generate` uses their
+    answers or waits for them.
+    
+    Fields for the `board_bank` are made by one worker each (see
+    `deposit`) with `scan_mines` when the worker has nothing else to
+    do.  They are stored in the bank by the worker, not sent back.
+    `generate` interrupts them and they are started over afterwards.
+    The workers that still have deposits to make are counted by
+    `depositing`, they are already in the load average.
+    
+    Worker number i (counting from zero) uses stream i + 1 of the
+    seed of the game (see `anonymine_rng`), so they don't try the
+    same fields, and answers with the origin of its field.
+    
+    There are `count_procs` workers to begin with.  More are forked
+    by `generate` when it's taking long and processors are free.
+    
+    Protocol (over pipes)
+    =====================
+    
+        Job:    "id width height gametype mines x y paramstring seed
+                strategy\n" (one line)
+                paramstring is "-" for a field that shall be answered,
+                otherwise the bank to deposit the field in (and x, y,
+                seed and strategy are "-").  See `guessless_mines`
+                for the strategy.
+        Answer: See `encode_answer`, or `encode_deposited` for a
+                deposit.
+        Answers to old jobs are ignored.
+    
+    Internals:
+        self.cfg        enginecfg.
+        self.workers    List of [pid, answer_fd, buffer, job_fd].
+        self.forked     Number of workers that have been forked.
+        self.job        The id of the last job.
+        self.next       Index of the worker that gets the next deposit.
+        self.running    pid: the job of the worker.
+        self.jobs       job: (dimensions, gametype, mines, startpoint)
+                        of the jobs that haven't been answered.
+        self.answers    job: (rejections, bitmap, origin), unused
+                        answers.
+        self.deposits   job: pid, the deposits that haven't been
+                        answered.
+    '''
+    def __init__(self, cfg):
+        '''
+        Fork `count_procs(cfg)` workers.  `cfg` is enginecfg.
+        '''
+        self.cfg = cfg
+        self.workers = []
+        self.forked = 0
+        self.job = 0
+        self.next = 0
+        self.running = {}
+        self.jobs = {}
+        self.answers = {}
+        self.deposits = {}
+        for i in range(count_procs(cfg)):
+            if not self.add():
+                break
+    
+    def add(self):
+        '''Fork one more worker.  Returns False if fork failed.'''
+        job_r, job_w = os.pipe()
+        answer_r, answer_w = os.pipe()
+        # SIGUSR1 would kill a worker that hasn't set up its handler.
+        default = signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+        try:
+            pid = os.fork()
+        except OSError:
+            signal.signal(signal.SIGUSR1, default)
+            for fd in (job_r, job_w, answer_r, answer_w):
+                os.close(fd)
+            return False
+        if pid:
+            signal.signal(signal.SIGUSR1, default)
+            os.close(job_r)
+            os.close(answer_w)
+            self.workers.append([pid, answer_r, b'', job_w])
+            self.forked += 1
+            return True
+        try:
+            # Only the parent may keep the other workers alive.
+            for worker in self.workers:
+                os.close(worker[1])
+                os.close(worker[3])
+            os.close(job_w)
+            os.close(answer_r)
+            self.worker(job_r, answer_w, self.cfg, self.forked + 1)
+        finally:
+            os._exit(0)
+    
+    def worker(self, job_fd, answer_fd, cfg, index):
+        '''(Internal)  The loop of a worker process, using stream
+        number `index`.
+        '''
+        state = {'busy': False}
+        def cancel(ignore1, ignore2):
+            if state['busy']:
+                raise cancelled()
+        def deposited(job):
+            try:
+                write_all(answer_fd, encode_deposited(job[0]))
+            except OSError:
+                pass
+        signal.signal(signal.SIGUSR1, cancel)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        bank = new_bank(cfg)
+        # (gametype, width, height) -> (field, solver)
+        warm = {}
+        # For the fields of the game and for the bank.
+        stream = rng.stream(rng.new_seed(), index)
+        deposit_stream = rng.stream(rng.new_seed(), index)
+        buffer = b''
+        deposits = []
+        failed = {}     # job -> number of unexpected errors
+        while True:
+            job = key = None
+            try:
+                # Read all jobs that have been sent, wait only when
+                # there is nothing to do.
+                while True:
+                    if deposits or b'\n' in buffer:
+                        timeout = 0
+                    else:
+                        timeout = None
+                    try:
+                        if not select.select([job_fd], [], [], timeout)[0]:
+                            break
+                    except select.error as e:
+                        if e.args[0] == errno.EINTR:
+                            continue
+                        raise
+                    data = read_some(job_fd)
+                    if not data:
+                        return
+                    buffer += data
+                lines = buffer.split(b'\n')
+                buffer = lines.pop()
+                # Only the last field to be answered is still wanted.
+                for line in lines:
+                    words = line.decode('ascii').split()
+                    if words[7] == '-':
+                        job = words
+                    else:
+                        deposits.append(words)
+                if job is None:
+                    job = deposits.pop(0)
+                (
+                    job_id, width, height, gametype, n_mines, x, y,
+                    bankname, seed, strategy
+                ) = job
+                key = (gametype, int(width), int(height))
+                if key not in warm:
+                    s = new_solver(cfg)
+                    warm[key] = (new_field(key[1:], gametype), s)
+                field, s = warm[key]
+                if bankname == '-':
+                    if int(seed) != stream.seed:
+                        stream = rng.stream(int(seed), index)
+                    state['busy'] = True
+                    mines, rejections = guessless_mines(
+                        field, s, int(n_mines), (int(x), int(y)), cfg,
+                        stream, strategy
+                    )
+                    state['busy'] = False
+                    write_all(answer_fd, encode_answer(
+                        job_id, field, mines, rejections, stream.origin()
+                    ))
+                elif bank is not None and not bank.full(bankname, field):
+                    state['busy'] = True
+                    mines, startpoints, rejections = scan_mines(
+                        field, s, int(n_mines), cfg, deposit_stream
+                    )
+                    state['busy'] = False
+                    bank.add(bankname, field, mines, startpoints)
+                if bankname != '-':
+                    deposited(job)
+            except cancelled:
+                state['busy'] = False
+                # The field may have been interrupted half cleared.
+                if key in warm:
+                    warm[key] = (new_field(key[1:], key[0]), warm[key][1])
+                # Do it later.
+                if job is not None and job[7] != '-':
+                    deposits.insert(0, job)
+            except EnvironmentError:
+                # The bank is not writable.
+                state['busy'] = False
+                if job is not None and job[7] != '-':
+                    deposited(job)
+            except Exception:
+                # A bug.  Keep working, with a new solver and field.
+                # A field for the game is tried again a few times
+                # (with the next random fields), deposits are dropped.
+                state['busy'] = False
+                warm = {}
+                log_error(cfg, 'Worker job: {0}'.format(job))
+                if job is not None and job[7] != '-':
+                    deposited(job)
+                if job is not None and job[7] == '-':
+                    tries = failed.get(job[0], 0) + 1
+                    failed = {job[0]: tries}
+                    if tries < 3:
+                        line = ' '.join(job).encode('ascii') + b'\n'
+                        buffer = line + buffer
+    
+    def alive(self):
+        '''True if there are workers.'''
+        return bool(self.workers)
+    
+    def send(self, worker, job, key, seed, strategy):
+        '''(Internal)  Interrupt `worker` and give it a new job.'''
+        dimensions, gametype, n_mines, startpoint = key
+        try:
+            os.kill(worker[0], signal.SIGUSR1)
+        except OSError:
+            pass
+        try:
+            write_all(worker[3], '{0} {1} {2} {3} {4} {5} {6} - {7} {8}\n'
+                .format(
+                    job, dimensions[0], dimensions[1], gametype, n_mines,
+                    startpoint[0], startpoint[1], seed, strategy
+                ).encode('ascii')
+            )
+        except OSError:
+            self.remove(worker)
+            return
+        self.jobs[job] = key
+        self.running[worker[0]] = job
+    
+    def poll(self):
+        '''Collect the answers that have arrived, without waiting.'''
+        if self.workers:
+            read_answers(self.workers, self.remove, self.answers, 0)
+        self.forget_answered()
+    
+    def forget_answered(self):
+        '''(Internal)  The workers that answered are done.'''
+        for pid in list(self.running):
+            if self.running[pid] in self.answers:
+                del self.running[pid]
+        for job in list(self.deposits):
+            if job in self.answers:
+                del self.deposits[job]
+                del self.answers[job]
+    
+    def depositing(self, job=None):
+        '''
+        Return the number of workers that have deposits to make, not
+        counting the workers on `job` (they're interrupted).
+        '''
+        pids = set(self.deposits.values())
+        for pid in self.running:
+            if self.running[pid] == job:
+                pids.discard(pid)
+        return len(pids)
+    
+    def answered(self, key):
+        '''
+        Return the answer (rejections, bitmap, origin) to a job for `key`,
+        (dimensions, gametype, mines, startpoint), that has arrived,
+        or None.
+        '''
+        for job in self.answers:
+            if self.jobs.get(job) == key:
+                return self.answers[job]
+        return None
+    
+    def speculate(self, dimensions, gametype, n_mines, startpoints, seed,
+                  strategy):
+        '''
+        Let the workers find fields for `startpoints` (most wanted
+        first), one for each worker, without waiting.  `seed` is the
+        seed of the game and `strategy` the strategy it uses, see
+        `guessless_mines`.  Workers that
+        are working on other startpoints are interrupted, unless there
+        are more workers than `startpoints`.
+        '''
+        self.poll()
+        wanted = []
+        for startpoint in startpoints:
+            key = (tuple(dimensions), gametype, n_mines, tuple(startpoint))
+            if key not in wanted and self.answered(key) is None:
+                wanted.append(key)
+        wanted = wanted[:len(self.workers)]
+        idle = []
+        for worker in self.workers:
+            key = self.jobs.get(self.running.get(worker[0]))
+            if key in wanted:
+                wanted.remove(key)
+            else:
+                idle.append(worker)
+        for key in wanted:
+            self.job += 1
+            self.send(idle.pop(0), self.job, key, seed, strategy)
+    
+    def generate(self, dimensions, gametype, n_mines, startpoint, seed,
+                 strategy, procs):
+        '''
+        Return (bitmap, rejections, origin, procs) for a solvable field,
+        see `pack_mines` and `game_engine.init_field2`.  `seed` is the
+        seed of the game and `strategy` the strategy it uses, see
+        `guessless_mines`.
+        
+        At most `procs` workers work on it (the returned `procs` is the
+        number that did), the others continue with their deposits.
+        Workers that are working on other startpoints go first, and
+        more are forked if there are too few.
+        
+        If there is no answer after cfg['init-field']['grow'] seconds
+        (default 1.0, None to never grow), and then as often, the
+        number is raised to `count_procs` (with the workers on it and
+        the `depositing` workers counted as busy) if that's more.
+        
+        An answer from `speculate` is used if there is one (`procs` is
+        0, nobody had to wait), and a worker that is already working
+        on `startpoint` is not interrupted.
+        
+        Raises OSError if there are no workers left.
+        '''
+        key = (tuple(dimensions), gametype, n_mines, tuple(startpoint))
+        self.poll()
+        answer = self.answered(key)
+        if answer is not None:
+            rejections, bitmap, origin = answer
+            self.forget()
+            return bitmap, rejections, origin, 0
+        # Join a job from `speculate` for the same key, new jobs always
+        # get a new number (answers to old jobs may still arrive).
+        self.job += 1
+        job = self.job
+        for pid in self.running:
+            if self.jobs[self.running[pid]] == key:
+                job = self.running[pid]
+        def order(worker):
+            if self.running.get(worker[0]) == job:
+                return 0
+            if worker[0] in self.running:
+                return 1
+            return 2
+        def assign(procs):
+            # Returns the number of workers on the job.
+            while len(self.workers) < procs and self.add():
+                pass
+            used = 0
+            for worker in sorted(self.workers, key=order):
+                if used >= procs:
+                    break
+                if self.running.get(worker[0]) != job:
+                    self.send(worker, job, key, seed, strategy)
+                used += 1
+            return used
+        used = assign(procs)
+        grow = self.cfg['init-field'].get('grow', 1.0)
+        if grow is not None:
+            grow_time = time.time() + grow
+        try:
+            while job not in self.answers:
+                if not self.workers:
+                    raise OSError(errno.ECHILD, 'No process found a field')
+                timeout = None
+                if grow is not None:
+                    timeout = max(0, grow_time - time.time())
+                read_answers(self.workers, self.remove, self.answers, timeout)
+                if job in self.answers or grow is None:
+                    continue
+                if time.time() >= grow_time:
+                    grow_time = time.time() + grow
+                    self.forget_answered()
+                    more = count_procs(
+                        self.cfg, used + self.depositing(job)
+                    )
+                    if more > used:
+                        used = assign(more)
+            rejections, bitmap, origin = self.answers.pop(job)
+        finally:
+            # Cancel the others.
+            self.forget()
+        return bitmap, rejections, origin, used
+    
+    def forget(self):
+        '''
+        Cancel the jobs from `speculate` and `generate` and forget
+        their answers.
+        '''
+        self.forget_answered()
+        for worker in self.workers:
+            if worker[0] in self.running:
+                try:
+                    os.kill(worker[0], signal.SIGUSR1)
+                except OSError:
+                    pass
+        self.running = {}
+        self.jobs = {}
+        self.answers = {}
+    
+    def deposit(self, paramstring, dimensions, gametype, n_mines):
+        '''
+        Make one worker put a solvable field in the `board_bank` under
+        `paramstring`, when it has nothing else to do.  Does not wait.
+        '''
+        if not self.workers:
+            return
+        self.job += 1
+        job = '{0} {1} {2} {3} {4} - - {5} - -\n'.format(
+            self.job, dimensions[0], dimensions[1], gametype, n_mines,
+            paramstring
+        ).encode('ascii')
+        self.next = (self.next + 1) % len(self.workers)
+        worker = self.workers[self.next]
+        try:
+            write_all(worker[3], job)
+        except OSError:
+            self.remove(worker)
+            return
+        self.deposits[self.job] = worker[0]
+    
+    def reap(self):
+        '''Forget the workers that have exited, without waiting.'''
+        for worker in list(self.workers):
+            try:
+                pid, status = os.waitpid(worker[0], os.WNOHANG)
+            except OSError:
+                pid = worker[0]
+            if pid:
+                self.remove(worker)
+    
+    def remove(self, worker):
+        '''(Internal)  Forget a dead worker.'''
+        self.workers.remove(worker)
+        self.running.pop(worker[0], None)
+        for job in list(self.deposits):
+            if self.deposits[job] == worker[0]:
+                del self.deposits[job]
+        for fd in (worker[1], worker[3]):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        try:
+            os.waitpid(worker[0], 0)
+        except OSError:
+            pass
+    
+    def stop(self):
+        '''Make the workers exit.'''
+        for worker in list(self.workers):
+            try:
+                os.kill(worker[0], signal.SIGUSR1)
+            except OSError:
+                pass
+            self.remove(worker)
+
+
+# The `field_workers` of this process, see `start_workers`.
+workers = None
+
+def start_workers(cfg):
+    '''
+    Start the `field_workers` used by every `game_engine` in this
+    process, if cfg['init-field']['workers'] is True and they haven't
+    already been started.  `cfg` is enginecfg.
+    '''
+    global workers
+    if workers is not None and workers.alive():
+        return
+    if not cfg['init-field'].get('workers', False):
+        return
+    if 'fork' not in dir(os):
+        return
+    workers = field_workers(cfg)
+
+
+def parse_paramstring(paramstring):
+    '''
+    Return (mines, width, height, gametype) from a paramstring like
+    "80@20x20-moore".  Raises ValueError.
+    '''
+    try:
+        n_mines, size = paramstring.split('@')
+        size, gametype = size.split('-')
+        width, height = size.split('x')
+        n_mines, width, height = int(n_mines), int(width), int(height)
+    except ValueError:
+        raise ValueError('Bad paramstring: ' + paramstring)
+    if gametype not in ('moore', 'hex', 'neumann'):
+        raise ValueError('Unknown gametype: ' + gametype)
+    return n_mines, width, height, gametype
+
+
+def fill_bank(cfgfile, paramstrings, progress=None):
+    '''
+    Fill the `board_bank` configured in `cfgfile` (path to enginecfg)
+    for every paramstring in `paramstrings`, with the workers if they
+    are enabled.  See `scan_mines`.
+    
+    `progress(paramstring, count, size)` is called after every field.
+    
+    Raises ValueError for bad paramstrings and when there is no bank.
+    '''
+    cfg = eval(open(cfgfile).read())
+    bank = new_bank(cfg)
+    if bank is None:
+        raise ValueError('No bank in ' + cfgfile)
+    games = []
+    for paramstring in paramstrings:
+        n_mines, width, height, gametype = parse_paramstring(paramstring)
+        if width < 4 or height < 4:
+            raise ValueError('Too small field: ' + paramstring)
+        if width * height > cfg['init-field']['sec-maxarea']:
+            raise security_alert('Area too large, aborting')
+        field = new_field((width, height), gametype)
+        # There must be room for a zero.
+        safe = len(field.get_neighbours((1, 1))) + 1
+        if not 0 < n_mines <= width * height - safe:
+            raise ValueError('Bad number of mines: ' + paramstring)
+        # Fail early if the bank isn't writable.
+        os.close(bank.open(paramstring))
+        games.append((paramstring, (width, height), gametype, field, n_mines))
+    start_workers(cfg)
+    if workers is not None:
+        for paramstring, dimensions, gametype, field, n_mines in games:
+            for i in range(bank.size - bank.count(paramstring, field)):
+                workers.deposit(paramstring, dimensions, gametype, n_mines)
+    s = new_solver(cfg)
+    for paramstring, dimensions, gametype, field, n_mines in games:
+        count = bank.count(paramstring, field)
+        while count < bank.size:
+            if workers is not None and workers.alive():
+                time.sleep(0.1)
+                workers.reap()
+            else:
+                mines, startpoints, rejections = scan_mines(
+                    field, s, n_mines, cfg
+                )
+                bank.add(paramstring, field, mines, startpoints)
+            old_count = count
+            count = bank.count(paramstring, field)
+            if progress is not None and count != old_count:
+                progress(paramstring, count, bank.size)
+
+
 class game_engine():
     r'''
     This class creates game engine objects.
@@ -551,6 +2159,10 @@ class game_engine():
         `engine.init_field(startpoint)` is the method that will place
             the mines and reveals the starting point, from which the
             game CAN be won.
+        
+        `engine.speculate(cursor)` may be called in 'pre-game' when
+            the player moves the cursor, the engine may start looking
+            for fields that can be started at or near it.
     
     
     Required methods of the interface object
@@ -581,6 +2193,14 @@ class game_engine():
             gametype=           # str; 'moore', 'hex' or 'neumann'
             guessless=          # bool; Must be possible to solve without
                                 #       guessing?
+            seed=               # int; Seed of the random fields, see
+                                #      `anonymine_rng`.  None (default)
+                                #      for a new seed.
+            replay=             # str; Play the field of an earlier
+                                #      game again, see `format_replay`
+                                #      and `self.replay`.  The
+                                #      parameters must match its
+                                #      paramstring.  None (default).
         
         As of version 0.0.20, no parameters are mandatory; they all
         have default values.  This may change in the future.
@@ -595,6 +2215,8 @@ class game_engine():
             'mines':     10,
             'gametype':  'moore',
             'guessless': True,
+            'seed':      None,
+            'replay':    None,
         }
         for key in default:
             if key not in parameters:
@@ -612,49 +2234,204 @@ class game_engine():
         self.gametype = parameters['gametype']
         self.n_mines = parameters['mines']
         self.guessless = parameters['guessless']
-        if self.gametype == 'hex':
-            self.field = fields.hexagonal_field(
-                parameters['width'],
-                parameters['height'],
-                True    # Flagcount
-            )
-        else:
-            self.field = fields.generic_field(
-                [parameters['width'], parameters['height']],
-                self.gametype == 'moore',
-                True    # Flagcount
-            )
+        self.field = new_field(self.dimensions, self.gametype)
+        # Used for the hiscores and the board bank.
+        self.paramstring = '{0}@{1}x{2}-{3}'.format(
+            self.n_mines,
+            self.dimensions[0],
+            self.dimensions[1],
+            self.gametype
+        )
+        if not self.guessless:
+            self.paramstring += '+losable'
         
         self.game_status = 'pre-game' # play-game game-won game-lost
-        
-        self.solver = solver.solver()
+        self.rejections = {}    # See `init_field2`.
+        self.speculated = None  # See `speculate`.
+        self.speculated_strategy = None
+        self.seed = parameters['seed']
+        if self.seed is None:
+            self.seed = rng.new_seed()
+        # (seed, stream, attempt) of the field, see `regenerate_mines`,
+        # and the `format_replay` string to make it again.  None for
+        # fields from the bank.
+        self.origin = None
+        self.replay = None
+        # (paramstring, origin, cell, symmetry, strategy) of the field
+        # to play again, see `parse_replay`.
+        self.replayed = None
+        if parameters['replay'] is not None:
+            self.replayed = parse_replay(parameters['replay'])
+            paramstring, origin, cell, symmetry, strategy = self.replayed
+            if paramstring != self.paramstring:
+                raise ValueError('The replay is for ' + paramstring)
+            if not (
+                0 <= cell[0] < self.dimensions[0] and
+                0 <= cell[1] < self.dimensions[1] and
+                0 <= symmetry < len(self.symmetries())
+            ):
+                raise ValueError('Bad replay: ' + parameters['replay'])
+        
+        self.solver = new_solver(self.cfg)
         self.solver.field = self.field
+        self.bank = None
+        self.stats = None
+        if self.guessless:
+            self.bank = new_bank(self.cfg)
+            self.stats = new_stats(self.cfg)
+        self.choose()
+        # Fork the workers while the player is still looking at the
+        # empty field.
+        if self.guessless and self.replayed is None:
+            start_workers(self.cfg)
+    
+    def choose(self):
+        '''(Internal)  Choose how to make the field, from what it took
+        to make the earlier fields for `self.paramstring` (see
+        `generation_stats`).  Sets:
+        
+            self.strategy   'reject' or 'repair', see
+                            `guessless_mines`.  With 'auto' in the
+                            configuration, the one with the shortest
+                            mean time, after each has made a few
+                            fields.
+            self.procs      Number of processes:  No more than
+                            needed for a wait of about 'fast' seconds,
+                            no more than the expected number of tries
+                            and no more than `count_procs` (with the
+                            `depositing` workers counted as busy).
+            self.use_bank   True if the bank shall be used:  Not when
+                            the field is made in 'fast' seconds anyway.
+            self.wait       Predicted wait in seconds, or None.
+        
+        With `procs` processes, the wait is one try if they're
+        expected to need at most one try each, otherwise the tries are
+        shared.
+        '''
+        init_field = self.cfg['init-field']
+        self.strategy = init_field.get('strategy', 'reject')
+        # The workers that make fields for the bank are in the load.
+        busy = 0
+        if workers is not None and workers.alive():
+            workers.poll()
+            busy = workers.depositing()
+        self.procs = count_procs(self.cfg, busy)
+        self.use_bank = self.bank is not None
+        self.wait = None
+        fast = init_field.get('fast', 0.2)
+        stats = {}
+        if self.stats is not None:
+            try:
+                for strategy in ('reject', 'repair'):
+                    stats[strategy] = self.stats.get(
+                        self.paramstring, strategy
+                    )
+            except EnvironmentError:
+                stats = {}
+        if self.strategy == 'auto':
+            self.strategy = 'reject'
+            if stats:
+                untried = [s for s in stats if stats[s][0] < 3]
+                if untried:
+                    self.strategy = min(
+                        untried, key=lambda s: (stats[s][0], s)
+                    )
+                else:
+                    self.strategy = min(
+                        stats, key=lambda s: stats[s][2] / stats[s][0]
+                    )
+        if not stats or not stats[self.strategy][0]:
+            return
+        fields, tries, seconds = stats[self.strategy]
+        per_field = tries / fields
+        per_try = seconds / tries
+        self.procs = max(1, min(
+            self.procs,
+            int(math.ceil(per_field * per_try / fast)),
+            int(math.ceil(per_field)),
+        ))
+        self.wait = per_try * max(1, per_field / self.procs)
+        self.use_bank = self.use_bank and self.wait > fast
     
     def init_field2(self, startpoint):
         '''(Internal use.)  Uses enginecfg.
         
         Uses multiple processes to test random fields to find a
         solvable one.  When a process finds a solvable field, it will
-        store the coordinates of the mines in a tempfile which will
-        then be read by the master process.
+        send the mines as a bitmap over a pipe to the master process.
+        (See `encode_answer`.)
+        
+        If the long lived `field_workers` have been started (see
+        `start_workers`), they are used instead.  They may already
+        have found a field after `speculate`.
         
         enginecfg['init-field']
-            'procs'     int: Number of slaves.
+            'procs'     int: Number of slaves, or 'auto' for the
+                        number of free processors, see `count_procs`.
+            'max-procs' int: The most processes 'auto' may use, or
+                        None (default) for no limit.
+            'grow'      float: Seconds before the workers working on
+                        a field are made more if processors are free,
+                        see `field_workers.generate`.  1.0 (default).
+            'workers'   bool: Keep `procs` workers for every game in
+                        this process instead of forking for each game.
+                        False (default).
             'maxtime'   float: Start over after having tried one field
-                        for this long.
-            'filename'  string: tempfile, filename.format(x)
-        '''
-        def child():
-            # The startpoint and its neighbours MUST NOT be mines.
-            safe = self.field.get_neighbours(startpoint) + [startpoint]
-            cells = list(filter(
-                lambda x: x not in safe,
-                self.field.all_cells()
-            ))
+                        for this long.  None (default) for no limit.
+            'maxnodes'  int: Start over after this many recursions
+                        or brute-force nodes.  None (default) for no
+                        limit.
+            'backend'   string: 'rules' (default) or 'sat', the solver
+                        used to test the fields.  See
+                        `anonymine_solver.sat_solver`.
+            'strategy'  string: 'reject' (default) to try new random
+                        fields until one is solvable, or 'repair' to
+                        move mines where the solver got stuck.  See
+                        `repair_mines`.  'auto' to let `choose` pick
+                        one.
+            'repairs'   int: Moves before 'repair' gives up on a
+                        field.  Default is the number of mines.
+            'patterns'  string: Directory of the pattern databases of
+                        the 'rules' backend (one for each player, see
+                        `load_patterns`), or None (default).  The
+                        process that finds the field adds what it
+                        learned.  See `anonymine_solver.pattern_db`.
+            'bank'      string: Directory of the `board_bank`, or None
+                        (default).  A banked field that is solvable
+                        from the startpoint is used if there is one
+                        (and if the solver agrees, see `check_banked`).
+                        The workers replace the fields taken from it
+                        when they are idle.
+            'bank-size' int: Number of fields to keep for each
+                        paramstring.  16 (default).
+            'stats'     string: Path to the `generation_stats`, or
+                        None (default).  What it took to make fields
+                        is recorded there and used by `choose`.
+            'fast'      float: The wait (seconds) `choose` aims for.
+                        0.2 (default).
+            'log'       string: File where the `field_workers` append
+                        unexpected errors (see `log_error`), or None
+                        (default) for stderr.
+        
+        The random fields are from `self.seed`:  Stream 0 in this
+        process, i + 1 in worker i and procs + i + 1 in the forked
+        process i.  `self.origin` is set to the origin of the field and
+        `self.replay` to its `format_replay` string (both None for a
+        field from the bank).
+        
+        The strategy, the number of processes and whether the bank is
+        used are chosen by `choose`.  The time it took to make the
+        field is added to the stats afterwards (not for fields from
+        the bank or from `speculate`).
+        
+        Fields that are obviously unsolvable are thrown away by the
+        `anonymine_solver.reject_filters` before they reach the
+        solver.  The number of fields each filter rejected in the
+        process that found the field will be in `self.rejections`,
+        'solver' is the number of fields given to the solver.
+        '''
+        def child(stream):
             # Set up handler for kill signal.
-            # Update 2016-07-15:  Processes will only be killed if their
-            #   tempfiles can't be deleted (most likely because they don't
-            #   exist yet);
             # Update 2018-11-07: Use SIGTERM instead of SIGCONT, the likelihood
             #   that new processes will spawn with the PID of a recently
             #   terminated is teeny-tiny.  Not crashing after having been
@@ -663,165 +2440,426 @@ class game_engine():
                 os._exit(0)
             signal.signal(signal.SIGTERM, die)
             # Solve
-            solved = False
-            while not solved:
-                # Choose self.n_mines randomly selected mines.
-                cells.sort(key=lambda x: os.urandom(1))
-                mines = cells[:self.n_mines]
-                self.field.clear()
-                self.field.fill(mines)
-                self.field.reveal(startpoint)
-                solved = self.solver.solve()[0]
-            # Store the mine coordinates in the tempfile.
-            try:
-                try:
-                    f = open(filename.format(os.getpid()), 'wx')
-                except ValueError:
-                    try:
-                        f = open(filename.format(os.getpid()), 'x')
-                    except ValueError:
-                        # WARNING WARNING
-                        f = open(filename.format(os.getpid()), 'w')
-            except:
-                raise security_alert('Exploit attempt (tempfile)!')
-            for x, y in mines:
-                f.write('{0} {1}\n'.format(x, y))
-            f.close()
+            return guessless_mines(
+                self.field, self.solver, self.n_mines, startpoint, self.cfg,
+                stream, self.strategy
+            )
         
         # FUNCTION STARTS HERE.
         # Clean up after whatever may have called us.
         self.field.clear()
-        unix = 'fork' in dir(os)
+        self.origin = None
+        self.replay = None
+        # The load may have changed since the engine was created.
+        self.choose()
+        
+        # Take a field from the bank.
+        if self.use_bank:
+            try:
+                banked = self.take_banked(startpoint)
+            except EnvironmentError:
+                banked = None
+            if banked is not None:
+                mines, start = banked
+                if self.check_banked(mines, start, startpoint):
+                    self.rejections = {}
+                    if workers is not None:
+                        workers.forget()
+                    self.refill_bank()
+                    return
+                self.field.clear()
+        
+        # Use the long lived workers if there are any.
+        if workers is not None and workers.alive():
+            if 'alarm' in dir(signal):      # (unix only)
+                def die(ignore1, ignore2):
+                    raise security_alert(
+                        'Initialization took too long, aborted'
+                    )
+                signal.signal(signal.SIGALRM, die)
+                signal.alarm(self.cfg['init-field']['sec-maxtime'])
+            try:
+                found = self.take_speculated(startpoint)
+                if found is None:
+                    starttime = time.time()
+                    bitmap, rejections, origin, procs = workers.generate(
+                        self.dimensions, self.gametype, self.n_mines,
+                        startpoint, self.seed, self.strategy, self.procs
+                    )
+                    mines = unpack_mines(self.field, bitmap)
+                    # An answer from before the first click is from
+                    # `speculate`.
+                    strategy = self.speculated_strategy
+                    if procs:
+                        strategy = self.strategy
+                        self.record(rejections, procs, starttime)
+                    found = (
+                        mines, startpoint, rejections, origin,
+                        startpoint, 0, strategy
+                    )
+                else:
+                    workers.forget()
+            except OSError:
+                # They're gone, fork new processes for this game.
+                found = None
+            finally:
+                if 'alarm' in dir(signal):
+                    signal.alarm(0)
+                    signal.signal(signal.SIGALRM, signal.SIG_IGN)
+            if found is not None:
+                (
+                    mines, start, self.rejections, self.origin,
+                    cell, symmetry, strategy
+                ) = found
+                self.replay = format_replay(
+                    self.paramstring, self.origin, cell, symmetry, strategy
+                )
+                self.field.fill(mines)
+                # Opens `startpoint` too.
+                self.field.reveal(start)
+                self.refill_bank()
+                return
         
-        # Need to know tempfile name before creating children because
-        # we're going to add 64 bits of entropy just in case exclusive
-        # opening somehow would fail to stop a tempfile exploit.
-        filename = self.cfg['init-field']['filename']
-        for i in range(8):
-            filename += '-'+str(ord(os.urandom(1)))
+        unix = 'fork' in dir(os)
         
         # 1. Create slaves (unix)
         # 2. Set up alarm
-        # 3. Fork error (not unix)
-        # 4. Wait for slaves to finish (unix)
+        # 3. Wait for the first answer (unix)
+        # 4. Fork error, no answer or not unix
         # 5. Enter mine coordinates
         
-        # 1: Create slaves.
+        # 1: Create slaves, each with a pipe for its answer.
         if unix:
-            children = []
-            for i in range(self.cfg['init-field']['procs']):
+            children = []       # [pid, fd, buffer]
+            procs = self.procs
+            starttime = time.time()
+            for i in range(procs):
+                answer_r, answer_w = os.pipe()
                 try:
                     pid = os.fork()
                 except:
+                    os.close(answer_r)
+                    os.close(answer_w)
                     # Do without fork if there are no children at all.
                     if not children:
                         unix = False
                     break
                 if pid:
-                    children.append(pid)
+                    os.close(answer_w)
+                    children.append([pid, answer_r, b''])
                 else:
                     try:
-                        child()
+                        os.close(answer_r)
+                        for sibling in children:
+                            os.close(sibling[1])
+                        stream = rng.stream(self.seed, procs + i + 1)
+                        mines, rejections = child(stream)
+                        write_all(answer_w, encode_answer(
+                            0, self.field, mines, rejections, stream.origin()
+                        ))
                         os._exit(0)
-                    except KeyboardInterrupt:
-                        # Kill the python interpreter on ^C.
+                    except:
+                        # Kill the python interpreter on ^C, a child
+                        # must never return to the game.
                         os._exit(1)
         
         # 2: Security timeout raises Exception
         if 'alarm' in dir(signal):      # (unix only)
             def die(ignore1, ignore2):
                 raise security_alert
+            def start_alarm():
+                signal.signal(signal.SIGALRM, die)
+                signal.alarm(self.cfg['init-field']['sec-maxtime'])
             def stop_alarm():
                 signal.signal(signal.SIGALRM, signal.SIG_IGN)
-            signal.signal(signal.SIGALRM, die)
-            signal.alarm(self.cfg['init-field']['sec-maxtime'])
         else:
+            def start_alarm():
+                pass
             def stop_alarm():
                 pass
+        start_alarm()
         security_timeout = False
         
-        # 3: Compatibility for non-unix systems, or on fork failure.
-        if not unix:
-            try:
-                child()
-                success_pid = os.getpid()
-            except security_alert:
-                security_timeout = True
-            stop_alarm()
-        
-        # 4: Wait for the first child to finish.
+        # 3: Wait for the first child to answer.
         if unix:
-            success_pid = 0
+            # Children that exit without answering are dropped here,
+            # and killed and waited for with the others below.
+            alive = list(children)
             try:
-                while success_pid not in children:
-                    while True:
-                        try:
-                            pid, status = os.wait()
-                        except OSError as e:
-                            if 'EINTR' in dir(errno):
-                                if e.errno == errno.EINTR:
-                                    continue
-                            raise
-                        except InterruptedError:
-                            continue
-                        break
-                    if os.WIFEXITED(status):
-                        success_pid = pid
+                self.rejections, bitmap, self.origin = first_answer(
+                    alive, 0, alive.remove
+                )
+                self.record(self.rejections, len(children), starttime)
+                mines = unpack_mines(self.field, bitmap)
             except security_alert:
                 security_timeout = True
-            stop_alarm()
-            # Kill all remaining children.
-            # Delete potential left-over tempfiles.
-            for child in children:
-                if child != success_pid:
+            except OSError:
+                # Every child died without an answer.
+                unix = False
+            finally:
+                stop_alarm()
+                # Kill all remaining children.
+                for pid, fd, buffer in children:
                     try:
-                        os.remove(filename.format(child))
+                        os.kill(pid, signal.SIGTERM)
                     except OSError:
-                        # File does not exist, process has not finished.
-                        try:
-                            os.kill(child, signal.SIGTERM)
-                            os.waitpid(child, 0)    # Destroy the zombie.
-                            os.remove(filename.format(child))
-                        except OSError:
-                            pass
+                        pass
+                    try:
+                        os.waitpid(pid, 0)      # Destroy the zombie.
+                    except OSError:
+                        pass
+                    os.close(fd)
+        
+        # 4: Compatibility for non-unix systems, or on fork failure,
+        #    or if the children died.  Not `child`, this process must
+        #    not exit on SIGTERM.
+        if not unix and not security_timeout:
+            start_alarm()
+            stream = rng.stream(self.seed, 0)
+            starttime = time.time()
+            try:
+                mines, self.rejections = guessless_mines(
+                    self.field, self.solver, self.n_mines, startpoint,
+                    self.cfg, stream, self.strategy
+                )
+                self.origin = stream.origin()
+                self.record(self.rejections, 1, starttime)
+            except security_alert:
+                security_timeout = True
+            finally:
+                stop_alarm()
         
         # 5: Done soplving the field, enter the mine locations:
         if security_timeout:
             raise security_alert('Initialization took too long, aborted')
-        # Parse the tempfile.
-        self.field.clear()
-        f = open(filename.format(success_pid))
-        lines = f.read().split('\n')[:-1]
-        f.close()
-        os.remove(filename.format(success_pid))
-        mines = []
-        for line in lines:
-            mine = list(map(int, line.split(' ')))
-            mines.append(mine)
         # Fill the field with the mines.
+        self.replay = format_replay(
+            self.paramstring, self.origin, startpoint, 0, self.strategy
+        )
+        self.field.clear()
         self.field.fill(mines)
         self.field.reveal(startpoint)
     
+    def symmetries(self):
+        '''
+        Return a list of (transform, inverse) for every symmetry of
+        the field.  They are functions that map a coordinate to a
+        coordinate, and a solvable field with all of its mines mapped
+        by a transform is solvable from the mapped startpoint.
+        
+        Square fields (Moore and von Neumann) have the 8 rotations
+        and mirrorings if width == height, otherwise the 4 that don't
+        swap x and y.
+        
+        Hexagonal fields only have two: Mirroring the columns would
+        move the indented rows to the other side.  If the height is
+        even, the field can be turned upside down (which swaps the
+        indented and not indented rows).  If it's odd, the rows can
+        be mirrored.
+        '''
+        w = self.dimensions[0] - 1
+        h = self.dimensions[1] - 1
+        def identity(cell):
+            return cell
+        def rotate(cell):       # 180 degrees
+            return (w - cell[0], h - cell[1])
+        def flip_y(cell):
+            return (cell[0], h - cell[1])
+        if self.gametype == 'hex':
+            if h % 2:
+                return [(identity, identity), (rotate, rotate)]
+            else:
+                return [(identity, identity), (flip_y, flip_y)]
+        def flip_x(cell):
+            return (w - cell[0], cell[1])
+        result = [
+            (identity, identity),
+            (rotate, rotate),
+            (flip_x, flip_x),
+            (flip_y, flip_y),
+        ]
+        if w == h:
+            def transpose(cell):
+                return (cell[1], cell[0])
+            def antitranspose(cell):
+                return (w - cell[1], w - cell[0])
+            def left(cell):     # 90 degrees
+                return (cell[1], w - cell[0])
+            def right(cell):    # 90 degrees
+                return (w - cell[1], cell[0])
+            result.extend([
+                (transpose, transpose),
+                (antitranspose, antitranspose),
+                (left, right),
+                (right, left),
+            ])
+        return result
+    
+    def candidates(self, startpoint):
+        '''(Internal)  Return a list of (cell, transform, index) where
+        the transform (`symmetries()[index]`) maps the cell to
+        `startpoint` or, later in the list, to a neighbour of it.  A
+        field that is solvable from the cell can be used:  Revealing
+        the mapped cell will reveal `startpoint` too, it's a zero.
+        '''
+        targets = [startpoint] + self.field.get_neighbours(startpoint)
+        result = []
+        cells = set()
+        for target in targets:
+            for index, symmetry in enumerate(self.symmetries()):
+                transform, inverse = symmetry
+                cell = inverse(tuple(target))
+                if cell not in cells:
+                    cells.add(cell)
+                    result.append((cell, transform, index))
+        return result
+    
+    def check_banked(self, mines, start, startpoint):
+        '''(Internal)  Fill the field with a field from the bank and
+        open `start`.  Returns True if `startpoint` was opened and the
+        solver can solve it:  The bank file could have been written by
+        someone else.
+        '''
+        if len(set(mines)) != self.n_mines:
+            return False
+        self.field.fill(mines)
+        if self.field.peek(start) != (False, 0):
+            return False
+        self.field.reveal(start)
+        if self.field.get(startpoint) is None:
+            return False
+        deadline = None
+        if self.cfg['init-field'].get('maxtime', None) is not None:
+            deadline = time.time() + self.cfg['init-field']['maxtime']
+        self.solver.field = self.field
+        return bool(self.solver.solve(
+            deadline, self.cfg['init-field'].get('maxnodes', None)
+        )[0])
+    
+    def take_banked(self, startpoint):
+        '''(Internal)  Take a field from the bank, see `candidates`.
+        
+        Returns (mines, mapped startpoint) or None.
+        '''
+        candidates = self.candidates(startpoint)
+        found = self.bank.take(
+            self.paramstring, self.field,
+            [candidate[0] for candidate in candidates]
+        )
+        if found is None:
+            return None
+        mines, index = found
+        cell, transform, symmetry = candidates[index]
+        return [transform(mine) for mine in mines], transform(cell)
+    
+    def take_speculated(self, startpoint):
+        '''(Internal)  Use a field the workers have found after
+        `speculate`, see `candidates`.
+        
+        Returns (mines, mapped startpoint, rejections, origin, cell,
+        symmetry, strategy) or None, see `format_replay`.
+        '''
+        workers.poll()
+        for cell, transform, symmetry in self.candidates(startpoint):
+            answer = workers.answered(
+                (self.dimensions, self.gametype, self.n_mines, cell)
+            )
+            if answer is not None:
+                rejections, bitmap, origin = answer
+                mines = unpack_mines(self.field, bitmap)
+                return (
+                    [transform(mine) for mine in mines], transform(cell),
+                    rejections, origin, cell, symmetry,
+                    self.speculated_strategy
+                )
+        return None
+    
+    def speculate(self, cursor):
+        '''Let the workers find fields for startpoints at and around
+        `cursor`, before the player has chosen a startpoint.
+        
+        Does nothing unless the game is in 'pre-game', or if the
+        cursor hasn't moved.  Work for startpoints that are no longer
+        near the cursor is cancelled.
+        '''
+        if self.game_status != 'pre-game' or not self.guessless:
+            return
+        if workers is None or not workers.alive():
+            return
+        if cursor == self.speculated or self.replayed is not None:
+            return
+        self.speculated = cursor
+        self.speculated_strategy = self.strategy
+        workers.speculate(
+            self.dimensions, self.gametype, self.n_mines,
+            [cursor] + self.field.get_neighbours(cursor),
+            self.seed, self.strategy
+        )
+    
+    def record(self, rejections, procs, starttime):
+        '''(Internal)  Add a field made by `procs` processes since
+        `starttime` to the stats, see `generation_stats`.
+        
+        The process that found it failed n - 1 times in the time it
+        took, and so did the others (it was first):  procs*(n - 1) + 1
+        tries, that took the time divided by n each.
+        '''
+        if self.stats is None:
+            return
+        n = max(1, rejections.get('solver', 0))
+        tries = procs * (n - 1) + 1
+        try:
+            self.stats.add(
+                self.paramstring, self.strategy,
+                tries, (time.time() - starttime) * tries / n
+            )
+        except EnvironmentError:
+            pass
+    
+    def refill_bank(self):
+        '''(Internal)  Let the workers replace the fields taken from
+        the bank.
+        '''
+        if not self.use_bank or workers is None:
+            return
+        try:
+            missing = self.bank.size - self.bank.count(
+                self.paramstring, self.field
+            )
+        except EnvironmentError:
+            return
+        for i in range(missing):
+            workers.deposit(
+                self.paramstring, self.dimensions, self.gametype, self.n_mines
+            )
+    
     def init_field(self, startpoint):
         '''Place the mines and reveal the starting point.
         
+        A replayed field (replay=) is opened at its own startpoint,
+        not at `startpoint`.
+        
         Internal details:
             It will wrap in `init_field2` in guessless mode.
             It will place the mines by itself when not in guessless
             mode.
         '''
-        if self.guessless:
+        if self.replayed is not None:
+            self.init_replay()
+        elif self.guessless:
             # Wrap in the best version.
             self.init_field2(startpoint)
         else:
-            safe = self.field.get_neighbours(startpoint) + [startpoint]
-            cells = list(filter(
-                lambda x: x not in safe,
-                self.field.all_cells()
-            ))
             # Choose self.n_mines randomly selected mines.
-            cells.sort(key=lambda x: os.urandom(1))
-            mines = cells[:self.n_mines]
+            stream = rng.stream(self.seed, 0)
+            mines = rng.sample(
+                stream.next(), safe_cells(self.field, startpoint),
+                self.n_mines
+            )
+            self.origin = stream.origin()
+            self.replay = format_replay(
+                self.paramstring, self.origin, startpoint, 0, self.strategy
+            )
             self.field.clear()
             self.field.fill(mines)
             self.field.reveal(startpoint)
@@ -837,6 +2875,26 @@ class game_engine():
         self.field.set_callback('win', win, self)
         self.field.set_callback('lose', lose, self)
     
+    def init_replay(self):
+        '''(Internal)  Make the field of `self.replayed` again, see
+        `regenerate_mines`, and reveal its startpoint.
+        '''
+        paramstring, origin, cell, symmetry, strategy = self.replayed
+        s = None
+        if self.guessless:
+            s = self.solver
+        mines = regenerate_mines(
+            self.field, s, self.n_mines, cell, self.cfg, origin, strategy
+        )
+        transform = self.symmetries()[symmetry][0]
+        self.origin = origin
+        self.replay = format_replay(
+            paramstring, origin, cell, symmetry, strategy
+        )
+        self.field.clear()
+        self.field.fill([transform(mine) for mine in mines])
+        self.field.reveal(transform(cell))
+    
     def flag(self, coordinate):
         '''Automatic flag/unflag at `coordinate`.
         '''
@@ -885,15 +2943,7 @@ class game_engine():
         interface.output(self)
         
         # Create a proper paramstring for the hiscores object.
-        paramstring = '{0}{1}@{2}x{3}-{4}'.format(
-            {True: "", False: "lost/"}[game_won],
-            self.n_mines,
-            self.dimensions[0],
-            self.dimensions[1],
-            self.gametype
-        )
-        if not self.guessless:
-            paramstring += '+losable'
+        paramstring = {True: "", False: "lost/"}[game_won] + self.paramstring
         mines_left = 0
         if not game_won:
             # Count the remaining mines. Flags != mines.
@@ -904,7 +2954,13 @@ class game_engine():
             fail = float(mines_left - self.field.flags_left)/self.n_mines
             if fail > .20:
                 mines_left = self.n_mines * 42
-        hs = hiscores(self.cfg['hiscores'], paramstring, delta_time, mines_left)
+        if self.replayed is not None:
+            # The player has seen the field before.
+            delta_time = None
+        hs = hiscores(
+            self.cfg['hiscores'], paramstring, delta_time, mines_left,
+            self.replay
+        )
         # NOTICE: This used to return game_won, delta_time
         
         # Do this last, so the player won't unfairly get a terrible time.
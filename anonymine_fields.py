@@ -61,6 +61,10 @@ class generic_field():
         reveal(self, coordinate)
             Reveal the free cell at `coordinate`
         
+        peek(self, coordinate)
+            (is_mine, number) of the cell at `coordinate` without
+            revealing it.  (For solvers.)
+        
         get_callback(self, function_name)
         set_callback(self, function_name, function, argument)
             function(self, argument)
@@ -453,6 +457,16 @@ class generic_field():
         elif not self.free_cells:
             self._call('win')
     
+    def peek(self, coordinate):
+        '''Return (is_mine, number) for the cell at `coordinate`.
+        
+        The cell is NOT revealed and no callbacks are called.  This is
+        used by solvers that keep their own knowledge of the field,
+        see `anonymine_solver.knowledge`.
+        '''
+        cell = self._get_raw(coordinate)
+        return cell[self.K_MINE], cell[self.K_NUMBER]
+    
     def fill(self, mines):
         '''Fill the field with mines and generate the numbers.
         
@@ -0,0 +1,131 @@
+#!/usr/bin/python
+
+# Copyright (c) Oskar Skog, 2016-2019
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1.  Redistributions of source code must retain the above copyright notice,
+#     this list of conditions and the following disclaimer.
+#
+# 2.  Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions and the following disclaimer in the documentation
+#     and/or other materials provided with the distribution.
+#
+# This software is provided by the copyright holders and contributors "as is"
+# and any express or implied warranties, including, but not limited to, the
+# implied warranties of merchantability and fitness for a particular purpose
+# are disclaimed. In no event shall the copyright holder or contributors be
+# liable for any direct, indirect, incidental, special, exemplary, or
+# consequential damages (including, but not limited to, procurement of
+# substitute goods or services; loss of use, data, or profits; or business
+# interruption) however caused and on any theory of liability, whether in
+# contract, strict liability, or tort (including negligence or otherwise)
+# arising in any way out of the use of this software, even if advised of the
+# possibility of such damage.
+
+'''Random mine placement for Anonymine
+
+Copyright (c) Oskar Skog, 2016-2019
+Released under the FreeBSD license.
+
+Random mine placement for Anonymine
+===================================
+
+    Every game has a seed (`new_seed`).  Each process that makes
+    fields for the game has its own `stream` of the seed, and every
+    field a stream tries (an attempt) has its own `random.Random`.
+    The origin (seed, stream, attempt) of a field is enough to make
+    the same random field again, no matter how many processes were
+    looking for it:
+
+        s = stream(seed, index)
+        rng = s.next()              # Attempt 1, 2, ...
+        mines = sample(rng, cells, n_mines)
+
+        mines == sample(attempt(seed, index, s.attempt), cells, n_mines)
+
+    Only `random.Random.random` is used, its output for a seed is the
+    same in all versions of Python.
+'''
+
+import os
+import random
+import hashlib
+import binascii
+
+
+def new_seed():
+    '''Return a new random seed (int) for a game.'''
+    return int(binascii.hexlify(os.urandom(8)), 16)
+
+
+def attempt(seed, index, number):
+    '''
+    Return the `random.Random` for attempt `number` of stream `index`
+    of `seed`.
+    '''
+    key = '{0}:{1}:{2}'.format(seed, index, number).encode('ascii')
+    return random.Random(int(hashlib.sha256(key).hexdigest()[:16], 16))
+
+
+class stream():
+    '''
+    The random numbers of one process for a game, independent of the
+    other streams of the same seed.
+
+        self.seed       The seed of the game.
+        self.index      The number of the stream.
+        self.attempt    The number of the last attempt, 0 before the
+                        first call to `next`.
+    '''
+    def __init__(self, seed, index):
+        self.seed = seed
+        self.index = index
+        self.attempt = 0
+
+    def next(self):
+        '''Return the `random.Random` for the next attempt.'''
+        self.attempt += 1
+        return attempt(self.seed, self.index, self.attempt)
+
+    def origin(self):
+        '''(seed, stream, attempt) of the last attempt.'''
+        return self.seed, self.index, self.attempt
+
+
+def sample(rng, population, k):
+    '''
+    Return a list of `k` different elements of the list `population`
+    chosen with `rng` (a `random.Random`).
+
+    This is a Fisher-Yates shuffle that stops after `k` elements and
+    remembers the swaps in a dictionary instead of swapping in a copy
+    of `population`:  O(k), not O(len(population)).
+    '''
+    n = len(population)
+    swapped = {}
+    result = []
+    for i in range(k):
+        j = i + int(rng.random() * (n - i))
+        result.append(population[swapped.get(j, j)])
+        swapped[j] = swapped.get(i, i)
+    return result
+
+
+def choice(rng, sequence):
+    '''Return a random element of the list `sequence`.'''
+    return sequence[int(rng.random() * len(sequence))]
+
+
+def format_origin(origin):
+    '''"seed,stream,attempt" for (seed, stream, attempt).'''
+    return ','.join(map(str, origin))
+
+
+def parse_origin(string):
+    '''(seed, stream, attempt) for "seed,stream,attempt".'''
+    seed, index, number = map(int, string.split(','))
+    return seed, index, number
+
+assert __name__ != '__main__', "I'm not a script."
@@ -118,6 +118,7 @@ Algorithm for solving and measuring the difficulty of minesweepers
     Rule 9:     Deserted cells/unsolved fields
     Rule 10:    Implementation considerations/internal
     Rule 11:    Implementation considerations/the field object
+    Rule 12:    Linear deductions (optional)
     
     
     0   The primary possibilities for a cell are the combinations of
@@ -276,6 +277,8 @@ Algorithm for solving and measuring the difficulty of minesweepers
         (-2) is used by rule 9.  A frequency on these mean that the
         rules were actually needed.
         
+        The special level (-3) is the frequency of rule 12.
+        
         The special level ('T') is the time it took in seconds.
         NOTICE: This will vary between machines.
     
@@ -387,6 +390,16 @@ Algorithm for solving and measuring the difficulty of minesweepers
         Rule 3 will automatically be included when checking if
         (min == flags).
         
+        The non-deserted cells are split into components that do not
+        share any number neighbours, and each component is
+        brute-forced on its own.  The cost is then the sum of the
+        components' exponentials rather than their product.
+        
+        The brute-force is a depth-first search that assigns one cell
+        at a time and abandons a branch as soon as a number neighbour
+        has too many mines or too few cells left for its mines.  Only
+        the lowest and highest mine counts are kept track of.
+        
         pseudocode {
         main loop:
             solve loop
@@ -507,13 +520,1074 @@ Algorithm for solving and measuring the difficulty of minesweepers
                     2. The same function is usually used by the actual
                         game.
         
+        The solver doesn't reveal or flag anything on the field
+        itself, it works on a `knowledge` of it (unless
+        `solver.mutate_field` is True, then `peek` is not needed):
+            field.peek(coordinate) MUST return (is_mine, number) for
+                the cell at coordinate without revealing it:  A
+                boolean and the number of mines around it.
+            
+            field.dimensions MUST be a sequence of the size of the field
+                along each axis, ex. (width, height).  The pattern
+                database (`pattern_db`) is only used for fields with
+                two dimensions.
+        
         Apart from the actual field, there is also the optional flags
         left count.  field.flags_left is an integer if it is available,
         but `None` if it is not.
+    
+    
+    12  Many of the deductions that rules 4 and 5 find with deep
+        recursions are linear.  Each unsolved cell is an equation:
+        the sum of its free neighbours (1 for mine, 0 for number) is
+        the number of flags it needs.
+        
+        The equations of each frontier component are row reduced.  A
+        row whose right hand side is the sum of its positive
+        coefficients can only be satisfied if the cells with positive
+        coefficients are mines and the cells with negative
+        coefficients are numbers.  Likewise if the right hand side is
+        the sum of the negative coefficients.
+        
+        If there are no deserted cells, the flags left count is added
+        as one more equation over every free cell.
+        
+        Illustration of the rule:
+            a b c d
+            1 2 2 1
+            - - - -
+        a + b = 1, a + b + c = 2, b + c + d = 2 and c + d = 1
+        The second minus the first row reduces to c = 1, the third
+        minus the fourth to b = 1, so b and c are flags and a and d
+        are numbers.
+        
+        This rule is optional (`solver.linear_tier`).  When enabled
+        it is tried before the solver loop raises i to 2, and each
+        time it finds something the frequency of the special level
+        (-3) is increased.  NumPy is used to row reduce if it is
+        available.
 '''
 
+import fractions
+import json
 import time
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import concurrent.futures as futures
+except ImportError:
+    futures = None
+
+
+def binomial(n, k):
+    '''
+    The number of ways to choose `k` of `n` elements, zero if `k` is
+    out of range.  (Exact, Python integers don't overflow.)
+    '''
+    if k < 0 or k > n:
+        return 0
+    k = min(k, n - k)
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def convolve(a, b):
+    '''
+    The distribution of the sum of two independent counts:  `a[i]`
+    and `b[j]` are the number of ways to get `i` and `j`.
+    '''
+    result = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+def search(n, constraints, visit, touched_only=False, prune=None,
+           tick=None):
+    '''
+    Depth-first enumeration of the possibilities of a component.
+    
+    `n` is the number of cells in the component and `constraints` is
+    a list of (needed, indices) tuples as returned by
+    `solver.frontier`.
+    
+    The cells are assigned one at a time (number first, then mine), a
+    branch is abandoned as soon as any constraint has too many mines
+    or not enough unassigned cells left for the needed mines.
+    
+    `visit(values, mines)` is called for each possibility, `values`
+    is a list of 0 (number) and 1 (mine) for each cell and `mines` is
+    the number of ones.  The list is reused, copy it if you need to
+    keep it.  The search stops if `visit` returns True.
+    
+    If `touched_only` is True, a constraint without any mines is not
+    in conflict.  This matches `solver.conflict(possibility, True)`,
+    which only checks the number neighbours of the possibility.
+    
+    `prune(level, mines)` is called before assigning the cell at
+    index `level`, the branch is abandoned if it returns True.
+    
+    `tick()` is called for every node, it may raise an exception to
+    abort the search.
+    
+    Returns True if `visit` stopped the search.
+    '''
+    cons_of = []
+    for i in range(n):
+        cons_of.append([])
+    need = []
+    left = []
+    for index, (needed, indices) in enumerate(constraints):
+        need.append(needed)
+        left.append(len(indices))
+        for i in indices:
+            cons_of[i].append(index)
+    placed = [0] * len(constraints)
+    values = [0] * n
+    # state[level]: 0 = unassigned, 1 = number tried, 2 = mine tried.
+    state = [0] * n
+    mines = 0
+    level = 0
+    while level >= 0:
+        if level == n:
+            if visit(values, mines):
+                return True
+            level -= 1
+            continue
+        tried = state[level]
+        if tried:
+            # Undo the previous value.
+            value = tried - 1
+            for index in cons_of[level]:
+                left[index] += 1
+                placed[index] -= value
+            mines -= value
+        else:
+            if tick is not None:
+                tick()
+            if prune is not None and prune(level, mines):
+                level -= 1
+                continue
+        if tried == 2:
+            state[level] = 0
+            level -= 1
+            continue
+        # Try the next value.
+        value = tried
+        state[level] = tried + 1
+        values[level] = value
+        mines += value
+        possible = True
+        for index in cons_of[level]:
+            left[index] -= 1
+            placed[index] += value
+            count = placed[index]
+            if touched_only and not count:
+                continue
+            if count > need[index] or count + left[index] < need[index]:
+                possible = False
+        if possible:
+            level += 1
+    return False
+
+
+def row_reduce(rows, n):
+    '''
+    Row reduce the augmented matrix `rows` (a list of lists of `n`
+    integer coefficients followed by the right hand side).
+    
+    Returns a new list of rows.  The rows are integers (scaled, but
+    not normalized) when NumPy is unavailable and floats otherwise.
+    '''
+    if numpy is not None:
+        matrix = numpy.array(rows, dtype=float)
+        pivot = 0
+        for column in range(n):
+            if pivot == len(rows):
+                break
+            best = pivot + int(numpy.argmax(abs(matrix[pivot:, column])))
+            if abs(matrix[best, column]) < 1e-9:
+                continue
+            matrix[[pivot, best]] = matrix[[best, pivot]]
+            matrix[pivot] /= matrix[pivot, column]
+            factors = matrix[:, column].copy()
+            factors[pivot] = 0.0
+            matrix -= numpy.outer(factors, matrix[pivot])
+            pivot += 1
+        return matrix.tolist()
+    def gcd(a, b):
+        while b:
+            a, b = b, a % b
+        return abs(a)
+    rows = [list(row) for row in rows]
+    pivot = 0
+    for column in range(n):
+        if pivot == len(rows):
+            break
+        for index in range(pivot, len(rows)):
+            if rows[index][column]:
+                break
+        else:
+            continue
+        rows[pivot], rows[index] = rows[index], rows[pivot]
+        pivot_row = rows[pivot]
+        a = pivot_row[column]
+        for index in range(len(rows)):
+            b = rows[index][column]
+            if index == pivot or not b:
+                continue
+            row = [a*x - b*y for x, y in zip(rows[index], pivot_row)]
+            divisor = 0
+            for x in row:
+                divisor = gcd(divisor, x)
+            if divisor > 1:
+                row = [x // divisor for x in row]
+            rows[index] = row
+        pivot += 1
+    return rows
+
+
+def linear_consequences(constraints, n):
+    '''
+    Rule 12 on a system of `n` cells and `constraints` (see
+    `solver.frontier`).
+    
+    Returns (mines, numbers), two lists of indices.
+    '''
+    rows = []
+    for needed, indices in constraints:
+        row = [0] * (n + 1)
+        for index in indices:
+            row[index] = 1
+        row[n] = needed
+        rows.append(row)
+    mines = []
+    numbers = []
+    for row in row_reduce(rows, n):
+        positive = negative = 0
+        for x in row[:n]:
+            if x > 1e-9:
+                positive += x
+            elif x < -1e-9:
+                negative += x
+        if not (positive or negative):
+            continue
+        if abs(row[n] - positive) < 1e-6:
+            sign = 1
+        elif abs(row[n] - negative) < 1e-6:
+            sign = -1
+        else:
+            continue
+        for index in range(n):
+            if row[index] * sign > 1e-9:
+                mines.append(index)
+            elif row[index] * sign < -1e-9:
+                numbers.append(index)
+    return mines, numbers
+
+
+def satisfy(n, constraints, assumptions=(), mines_range=None, tick=None):
+    '''
+    DPLL search for one possibility of a component.
+    
+    `n` and `constraints` are as in `search`, but every constraint
+    must be satisfied exactly (an untouched constraint is not
+    automatically satisfied).
+    
+    `assumptions` is a sequence of (index, value) tuples that are
+    assigned before the search begins.
+    
+    If `mines_range` is a (lowest, highest) tuple, the total number
+    of mines must be within the range (inclusive).
+    
+    `tick()` is called for every decision, it may raise an exception
+    to abort the search.
+    
+    Each assignment is followed by unit propagation:  a constraint
+    that has all its mines gets the rest of its cells assigned as
+    numbers, and a constraint that needs all of its unassigned cells
+    gets them assigned as mines.  On a conflict the latest decision
+    is flipped (number first, then mine) or undone.
+    
+    Returns a list of 0 (number) and 1 (mine) for each cell, or None
+    if there is no such possibility.
+    '''
+    members = []
+    low = []
+    high = []
+    for needed, indices in constraints:
+        members.append(indices)
+        low.append(needed)
+        high.append(needed)
+    if mines_range is not None:
+        members.append(range(n))
+        low.append(mines_range[0])
+        high.append(mines_range[1])
+    cons_of = []
+    for i in range(n):
+        cons_of.append([])
+    for index, indices in enumerate(members):
+        for i in indices:
+            cons_of[i].append(index)
+    placed = [0] * len(members)
+    free = [len(indices) for indices in members]
+    values = [None] * n
+    trail = []
+    
+    def assign(i, value):
+        values[i] = value
+        trail.append(i)
+        for index in cons_of[i]:
+            free[index] -= 1
+            placed[index] += value
+    
+    def undo(mark):
+        while len(trail) > mark:
+            i = trail.pop()
+            value = values[i]
+            values[i] = None
+            for index in cons_of[i]:
+                free[index] += 1
+                placed[index] -= value
+    
+    def propagate(queue):
+        while queue:
+            index = queue.pop()
+            count = placed[index]
+            unassigned = free[index]
+            if count > high[index] or count + unassigned < low[index]:
+                return False
+            if not unassigned:
+                continue
+            if count == high[index]:
+                value = 0
+            elif count + unassigned == low[index]:
+                value = 1
+            else:
+                continue
+            for i in members[index]:
+                if values[i] is None:
+                    assign(i, value)
+                    queue.extend(cons_of[i])
+        return True
+    
+    for i, value in assumptions:
+        if values[i] is None:
+            assign(i, value)
+        elif values[i] != value:
+            return None
+    if not propagate(list(range(len(members)))):
+        return None
+    # decisions: (length of trail before the decision, index, value)
+    decisions = []
+    position = 0
+    while True:
+        while position < n and values[position] is not None:
+            position += 1
+        if position == n:
+            return values
+        if tick is not None:
+            tick()
+        decisions.append((len(trail), position, 0))
+        assign(position, 0)
+        ok = propagate(list(cons_of[position]))
+        while not ok:
+            if not decisions:
+                return None
+            mark, i, value = decisions.pop()
+            undo(mark)
+            position = min(position, i)
+            if not value:
+                decisions.append((mark, i, 1))
+                assign(i, 1)
+                ok = propagate(list(cons_of[i]))
+
+
+def sealed_cells(field, mines):
+    '''
+    Reject filter:  A free safe cell and a mine that are both
+    completely surrounded by mines.
+    
+    No number can ever see either of them, so swapping them gives a
+    field with the same numbers:  one of them must be guessed.
+    
+    `mines` is a set of the mines on `field`.  Returns True if the
+    field can't be solved without guessing.
+    '''
+    sealed_safe = False
+    sealed_mine = False
+    for cell in field.all_cells():
+        if cell not in mines and field.get(cell) is not None:
+            continue
+        for neighbour in field.get_neighbours(cell):
+            if neighbour not in mines:
+                break
+        else:
+            if cell in mines:
+                sealed_mine = True
+            else:
+                sealed_safe = True
+            if sealed_safe and sealed_mine:
+                return True
+    return False
+
+
+def fifty_fifty(field, mines):
+    '''
+    Reject filter:  A mine next to a free safe cell where every other
+    safe cell is a neighbour to both or neither of them.
+    
+    Swapping the two gives a field with the same numbers (except for
+    the number of the free cell, which can't be seen without guessing).
+    This is the classic 50/50 pattern at walls and corners.
+    
+    `mines` is a set of the mines on `field`.  Returns True if the
+    field can't be solved without guessing.
+    '''
+    for mine in mines:
+        mine_neighbours = set(field.get_neighbours(mine))
+        for cell in mine_neighbours:
+            if cell in mines or field.get(cell) is not None:
+                continue
+            cell_neighbours = set(field.get_neighbours(cell))
+            for other in mine_neighbours ^ cell_neighbours:
+                if other not in mines and other != mine and other != cell:
+                    break
+            else:
+                return True
+    return False
+
+
+# (name, function) of the reject filters, cheapest first.
+# A filter must only reject fields that no solver could solve.
+reject_filters = [
+    ('sealed', sealed_cells),
+    ('50/50', fifty_fifty),
+]
+
+def possibility_bounds(n, constraints, include_all, stop_below=None,
+                       tick=None):
+    '''
+    Rule 9 on one component of `n` cells, see `solver.component_bounds`.
+    
+    Returns (lowest, highest, subsets) where `subsets` is the number
+    of possibilities that were enumerated.
+    '''
+    bounds = [None, None, 0]
+    def visit(values, mines):
+        bounds[2] += 1
+        if not mines or (mines == n and not include_all):
+            return False
+        if bounds[1] is None or mines > bounds[1]:
+            bounds[1] = mines
+        if bounds[0] is None or mines < bounds[0]:
+            bounds[0] = mines
+            if stop_below is not None and mines < stop_below:
+                return True
+        return False
+    def prune(level, mines):
+        # Give up on branches that can't move either bound.
+        if bounds[0] is None:
+            return False
+        return mines >= bounds[0] and mines + n - level <= bounds[1]
+    search(n, constraints, visit, True, prune, tick)
+    return bounds[0], bounds[1], bounds[2]
+
+
+def possibility_distribution(n, constraints, tick=None):
+    '''
+    Enumerate the possibilities of one component of `n` cells, see
+    `solver.component_distribution`.
+    
+    Returns (ways, counts).
+    '''
+    ways = [0] * (n + 1)
+    counts = []
+    for mines in range(n + 1):
+        counts.append([0] * n)
+    def visit(values, mines):
+        ways[mines] += 1
+        row = counts[mines]
+        for index in range(n):
+            if values[index]:
+                row[index] += 1
+        return False
+    search(n, constraints, visit, tick=tick)
+    return ways, counts
+
+
+def forced_values(n, constraints, mines_range=None, tick=None):
+    '''
+    Find the cells of one component of `n` cells that have the same
+    value in every possibility, see `sat_solver.forced`.
+    
+    Returns (mines, numbers) or None.
+    '''
+    witness = satisfy(n, constraints, (), mines_range, tick)
+    if witness is None:
+        return None
+    witness = list(witness)
+    candidates = [True] * n
+    mines = []
+    numbers = []
+    for index in range(n):
+        if not candidates[index]:
+            continue
+        other = satisfy(
+            n, constraints, [(index, 1 - witness[index])], mines_range, tick
+        )
+        if other is None:
+            if witness[index]:
+                mines.append(index)
+            else:
+                numbers.append(index)
+            continue
+        for i in range(index, n):
+            if other[i] != witness[i]:
+                candidates[i] = False
+    return mines, numbers
+
+
+def mines_bounds(n, constraints, tick=None):
+    '''
+    The lowest and highest number of mines among the possibilities of
+    one component of `n` cells, see `sat_solver.mine_bounds`.
+    '''
+    bounds = []
+    for lowest in (True, False):
+        # Binary search with the total number of mines as an extra
+        # constraint.
+        a, b = 0, n
+        while a < b:
+            if lowest:
+                middle = (a + b) // 2
+                mines_range = (0, middle)
+            else:
+                middle = (a + b + 1) // 2
+                mines_range = (middle, n)
+            found = satisfy(n, constraints, (), mines_range, tick)
+            if found is not None:
+                if lowest:
+                    b = sum(found)
+                else:
+                    a = sum(found)
+            elif lowest:
+                a = middle + 1
+            else:
+                b = middle - 1
+        bounds.append(a)
+    return bounds[0], bounds[1]
+
+class knowledge():
+    '''
+    The private state of a solver:  what is known about a field.
+    
+    It has the methods of the field that the solver uses (`get`,
+    `flag`, `reveal`, `get_neighbours` and `all_cells`) and the
+    `flags_left` attribute, but flagging and revealing only changes
+    the knowledge.  The field is only read, with `peek`, when a cell
+    is revealed.  No callbacks are called and several solvers can
+    work on the same field.
+    
+    Internals:
+        self.index      Coordinate to index.
+        self.mines      Bitset (int) of the flagged cells.
+        self.safe       Bitset (int) of the revealed cells.
+        self.numbers    List of the revealed numbers, None for
+                        unknown cells.  ('X' for a revealed mine.)
+    '''
+    def __init__(self, field):
+        '''
+        Start with what is visible on `field`.
+        '''
+        self.source = field
+        self.dimensions = field.dimensions
+        self.cells = field.all_cells()
+        self.index = dict(zip(self.cells, range(len(self.cells))))
+        self.flags_left = field.flags_left
+        self.mines = 0
+        self.safe = 0
+        self.numbers = [None] * len(self.cells)
+        for index, cell in enumerate(self.cells):
+            value = field.get(cell)
+            if value == 'F':
+                self.mines |= 1 << index
+            elif value is not None:
+                self.safe |= 1 << index
+                self.numbers[index] = value
+    
+    def get(self, coordinate):
+        '''See `anonymine_fields.generic_field.get`.'''
+        index = self.index[coordinate]
+        if self.mines >> index & 1:
+            return 'F'
+        return self.numbers[index]
+    
+    def flag(self, coordinate):
+        '''Mark the cell at `coordinate` as a known mine.'''
+        index = self.index[coordinate]
+        if (self.mines | self.safe) >> index & 1:
+            return
+        if self.flags_left is not None:
+            if not self.flags_left:
+                return
+            self.flags_left -= 1
+        self.mines |= 1 << index
+    
+    def reveal(self, coordinate):
+        '''Find out the number of the cell at `coordinate`.
+        
+        Zeroes are expanded like on the field.
+        '''
+        coordinates = [coordinate]
+        while coordinates:
+            coordinate = coordinates.pop()
+            index = self.index[coordinate]
+            if (self.mines | self.safe) >> index & 1:
+                continue
+            is_mine, number = self.source.peek(coordinate)
+            self.safe |= 1 << index
+            if is_mine:
+                self.numbers[index] = 'X'
+                continue
+            self.numbers[index] = number
+            if number == 0:
+                coordinates.extend(self.source.get_neighbours(coordinate))
+    
+    def get_neighbours(self, coordinate):
+        '''See `anonymine_fields.generic_field.get_neighbours`.'''
+        return self.source.get_neighbours(coordinate)
+    
+    def all_cells(self):
+        '''See `anonymine_fields.generic_field.all_cells`.'''
+        return list(self.cells)
+    
+    def snapshot(self):
+        '''Return the state of the knowledge, for `restore`.'''
+        return self.mines, self.safe, list(self.numbers), self.flags_left
+    
+    def restore(self, state):
+        '''Go back to a state from `snapshot`.'''
+        self.mines, self.safe, numbers, self.flags_left = state
+        self.numbers = list(numbers)
+    
+    def apply(self, field=None):
+        '''
+        Flag and reveal the known cells on `field` (default: the
+        field this knowledge is about).
+        '''
+        if field is None:
+            field = self.source
+        for index, cell in enumerate(self.cells):
+            value = field.get(cell)
+            if self.mines >> index & 1:
+                if value is None:
+                    field.flag(cell)
+            elif self.safe >> index & 1:
+                if value is None:
+                    field.reveal(cell)
+
+def openings(field):
+    '''
+    Return the zero regions of `field` (which must have its mines),
+    largest first.  Each is a list of the cells that would reveal the
+    same opening, and that have no mines around them.
+    '''
+    regions = []
+    seen = set()
+    for cell in field.all_cells():
+        if cell in seen or field.peek(cell) != (False, 0):
+            continue
+        seen.add(cell)
+        region = [cell]
+        queue = [cell]
+        while queue:
+            for neighbour in field.get_neighbours(queue.pop()):
+                if neighbour in seen or field.peek(neighbour) != (False, 0):
+                    continue
+                seen.add(neighbour)
+                region.append(neighbour)
+                queue.append(neighbour)
+        regions.append(region)
+    regions.sort(key=len, reverse=True)
+    return regions
+
+def forced_cells(field):
+    '''
+    Return (mines, safe):  the sets of free cells of `field` (or a
+    `knowledge`) that have the same value in every possibility left
+    by the revealed numbers, the flags and the flags left count.
+    Both are empty if there is no possibility.
+    
+    Unlike `sat_solver.deductions`, the flags left count is used
+    exactly:  each component may only have a number of mines that
+    the other components and the deserted cells can make up for.
+    '''
+    s = solver()
+    s.field = field
+    components, deserted_cells = s.frontier()
+    flags_left = field.flags_left
+    # The numbers of mines each component can have.
+    counts = []
+    for cells, constraints in components:
+        lowest, highest = mines_bounds(len(cells), constraints)
+        counts.append(set([
+            m for m in range(lowest, highest + 1)
+            if satisfy(len(cells), constraints, (), (m, m)) is not None
+        ]))
+        if not counts[-1]:
+            return set(), set()
+    def sums(sets):
+        result = set([0])
+        for numbers in sets:
+            result = set([a + b for a in result for b in numbers])
+        return result
+    mines = set()
+    safe = set()
+    for index, component in enumerate(components):
+        cells, constraints = component
+        if flags_left is None:
+            allowed = sorted(counts[index])
+        else:
+            others = sums(counts[:index] + counts[index + 1:])
+            allowed = sorted([
+                m for m in counts[index]
+                if [
+                    other for other in others
+                    if 0 <= flags_left - m - other <= len(deserted_cells)
+                ]
+            ])
+        if not allowed:
+            return set(), set()
+        # Forced in every possible number of mines.
+        forced = None
+        for m in allowed:
+            result = forced_values(len(cells), constraints, (m, m))
+            result = (set(result[0]), set(result[1]))
+            if forced is None:
+                forced = result
+            else:
+                forced = (forced[0] & result[0], forced[1] & result[1])
+        mines.update([cells[i] for i in forced[0]])
+        safe.update([cells[i] for i in forced[1]])
+    if deserted_cells and flags_left is not None:
+        left = set([flags_left - total for total in sums(counts)])
+        left = [n for n in left if 0 <= n <= len(deserted_cells)]
+        if not left:
+            return set(), set()
+        if left == [0]:
+            safe.update(deserted_cells)
+        elif left == [len(deserted_cells)]:
+            mines.update(deserted_cells)
+    return mines, safe
+
+def replay(field, trace):
+    '''
+    Verify a trace recorded by `solver.solve(record=True)`.
+    
+    `field` must have its mines and the same starting cells revealed
+    as when the trace was recorded.  The field is only read (see
+    `knowledge`).
+    
+    Every step must be forced by what is known before it:  the cells
+    it flags must be mines and the cells it reveals must be safe in
+    every possibility left by the revealed numbers, the flags and the
+    flags left count (see `forced_cells`), whatever rule the solver
+    used, or be opened by a zero that was.  No cell may be decided
+    twice.  A trace of lucky guesses is not valid even if the guesses
+    were right.
+    
+    Returns True if the trace is valid and ends with every cell that
+    isn't a mine revealed, a proof that the field can be solved
+    without guessing.  Each step costs a search of the frontier.
+    '''
+    state = knowledge(field)
+    for level, flagged, revealed in trace:
+        for cell in flagged + revealed:
+            if state.get(cell) is not None:
+                return False
+        mines, safe = forced_cells(state)
+        for cell in flagged:
+            if cell not in mines:
+                return False
+        for cell in flagged:
+            state.flag(cell)
+            if state.get(cell) != 'F':
+                # Out of flags.
+                return False
+        for cell in revealed:
+            if cell in safe and state.get(cell) is None:
+                state.reveal(cell)
+        # The others must have been opened by a zero.
+        for cell in revealed:
+            if state.get(cell) in (None, 'F', 'X'):
+                return False
+    for cell in state.cells:
+        if state.get(cell) is None and not field.peek(cell)[0]:
+            return False
+    return True
+
+
+class pattern_db():
+    '''
+    Windows around cells and what `solver.cell_solver` did with them.
+    
+    In modes 0 and 1 the result of `cell_solver` only depends on the
+    cells within the radius 3 + 2*i (see `solver.forget`), so a cell
+    with a window that has been seen before (on any field) can be
+    solved the same way without doing the work again.  The windows are
+    normalised under the symmetries of the grid, 8 for square fields
+    and 12 for hexagonal fields, so that a wall or a corner shares
+    its entry with its mirrored and rotated versions.
+    
+    Only two dimensional fields are supported, `window` returns None
+    for the others.
+    
+        db = pattern_db()
+        db.load(open(path))
+        s.patterns = db
+        ...
+        db.save(open(path, 'r+'))
+    
+    The engine keeps one file for each player, see
+    `anonymine_engine.load_patterns`.  `solver.plausible` checks a
+    recalled entry against the numbers around it before it's used.
+    
+    File format
+    ===========
+    
+        One entry per line:
+            difficulty window status flags numbers
+        `window` is one character per cell:  '.' for free cells, 'F'
+        for flags, '#' for outside the field or the number.  `flags`
+        and `numbers` are comma separated indices into the window, or
+        '-' if there are none.
+    
+    Internals:
+        self.entries    (difficulty, window) -> (status, flags,
+                        numbers) where `flags` and `numbers` are
+                        tuples of indices into the window.
+        self.templates  (kind, radius) -> (offsets, symmetries),
+                        each symmetry is a permutation of the
+                        indices into `offsets`.
+        self.added      The number of entries since `load` or `save`.
+    '''
+    def __init__(self, max_entries=200000):
+        '''
+        Entries are only added while there are less than
+        `max_entries`.
+        '''
+        self.entries = {}
+        self.templates = {}
+        self.added = 0
+        self.max_entries = max_entries
+    
+    def kind(self, field):
+        '''
+        Return 'moore', 'neumann', 'hex' or None (unsupported) for
+        `field` (or the field of a `knowledge` object).
+        '''
+        field = getattr(field, 'source', field)
+        if len(field.dimensions) != 2:
+            return None
+        # `hexagonal_field` doesn't have `moore`.
+        moore = getattr(field, 'moore', None)
+        if moore is None:
+            return 'hex'
+        elif moore:
+            return 'moore'
+        else:
+            return 'neumann'
+    
+    def template(self, kind, radius):
+        '''
+        Return (offsets, symmetries) for a window of `radius` steps.
+        
+        The offsets of hexagonal windows are axial coordinates (the
+        x axis leans with the odd lines).
+        '''
+        key = (kind, radius)
+        if key in self.templates:
+            return self.templates[key]
+        if kind == 'hex':
+            inside = lambda x, y: max(abs(x), abs(y), abs(x + y)) <= radius
+            turn = lambda x, y: (-y, x + y)
+            turns = 6
+        elif kind == 'moore':
+            inside = lambda x, y: max(abs(x), abs(y)) <= radius
+            turn = lambda x, y: (-y, x)
+            turns = 4
+        else:
+            inside = lambda x, y: abs(x) + abs(y) <= radius
+            turn = lambda x, y: (-y, x)
+            turns = 4
+        offsets = []
+        for y in range(-radius, radius + 1):
+            for x in range(-radius, radius + 1):
+                if inside(x, y):
+                    offsets.append((x, y))
+        index = dict(zip(offsets, range(len(offsets))))
+        symmetries = []
+        for mirror in (False, True):
+            for n in range(turns):
+                permutation = []
+                for x, y in offsets:
+                    if mirror:
+                        x, y = y, x
+                    for ignored in range(n):
+                        x, y = turn(x, y)
+                    permutation.append(index[(x, y)])
+                symmetries.append(permutation)
+        self.templates[key] = (offsets, symmetries)
+        return offsets, symmetries
+    
+    def window(self, field, cell, radius):
+        '''
+        Return (window, cells) for the cells within `radius` steps
+        from `cell`, or None if the field isn't supported.
+        
+        `window` is the canonical string (see the file format) and
+        `cells` the coordinates of its characters (None outside the
+        field).
+        '''
+        kind = self.kind(field)
+        if kind is None:
+            return None
+        offsets, symmetries = self.template(kind, radius)
+        width, height = field.dimensions
+        x, y = cell
+        if kind == 'hex':
+            x -= (y - (y & 1)) // 2
+        cells = []
+        characters = []
+        for dx, dy in offsets:
+            cell_y = y + dy
+            cell_x = x + dx
+            if kind == 'hex':
+                cell_x += (cell_y - (cell_y & 1)) // 2
+            if 0 <= cell_x < width and 0 <= cell_y < height:
+                value = field.get((cell_x, cell_y))
+                cells.append((cell_x, cell_y))
+                if value is None:
+                    characters.append('.')
+                elif value == 'F':
+                    characters.append('F')
+                elif value == 'X':
+                    return None
+                else:
+                    characters.append(str(value))
+            else:
+                cells.append(None)
+                characters.append('#')
+        best = None
+        for permutation in symmetries:
+            window = ''.join([characters[k] for k in permutation])
+            if best is None or window < best:
+                best = window
+                best_permutation = permutation
+        return best, [cells[k] for k in best_permutation]
+    
+    def recall(self, window, difficulty):
+        '''
+        Return (status, flags, numbers) for a `window` from `window`
+        or None if it hasn't been seen at this `difficulty`.
+        '''
+        window, cells = window
+        entry = self.entries.get((difficulty, window))
+        if entry is None:
+            return None
+        status, flags, numbers = entry
+        return (
+            status,
+            [cells[k] for k in flags],
+            [cells[k] for k in numbers],
+        )
+    
+    def learn(self, window, difficulty, status, flags, numbers):
+        '''
+        Remember that `cell_solver` returned `status` and flagged
+        `flags` and revealed `numbers` for `window` (from `window`).
+        '''
+        if len(self.entries) >= self.max_entries:
+            return
+        window, cells = window
+        self.entries[(difficulty, window)] = (
+            status,
+            tuple([cells.index(cell) for cell in flags]),
+            tuple([cells.index(cell) for cell in numbers]),
+        )
+        self.added += 1
+    
+    def load(self, f):
+        '''
+        Add the entries from the file object `f`.  Malformed lines are
+        ignored.
+        '''
+        def indices(string, size):
+            if string == '-':
+                return ()
+            values = tuple(map(int, string.split(',')))
+            for value in values:
+                if not 0 <= value < size:
+                    raise ValueError('Index outside the window')
+            return values
+        for line in f:
+            if len(self.entries) >= self.max_entries:
+                break
+            try:
+                difficulty, window, status, flags, numbers = line.split()
+                if status not in ('C', 'P', 'B'):
+                    raise ValueError('Unknown status')
+                self.entries[(int(difficulty), window)] = (
+                    status,
+                    indices(flags, len(window)),
+                    indices(numbers, len(window)),
+                )
+            except ValueError:
+                continue
+        self.added = 0
+    
+    def save(self, f):
+        '''
+        Merge the new entries into the file object `f` (opened for
+        reading and writing), which is rewritten in place.
+        
+        The caller must lock the file if concurrent games share it
+        (see `anonymine_engine.save_patterns`).
+        '''
+        if not self.added:
+            return
+        f.seek(0)
+        self.load(f)
+        def indices(values):
+            if not values:
+                return '-'
+            return ','.join(map(str, values))
+        lines = []
+        for key in self.entries:
+            status, flags, numbers = self.entries[key]
+            lines.append('{0} {1} {2} {3} {4}\n'.format(
+                key[0], key[1], status, indices(flags), indices(numbers)
+            ))
+        f.seek(0)
+        f.truncate()
+        f.write(''.join(lines))
+        f.flush()
+        self.added = 0
+
+
+class gave_up(Exception):
+    '''Raised inside `solver.solve` when its budget has been spent.'''
+    pass
+
+
 class solver():
     '''
     The reason why this is a class rather than a function is quite
@@ -535,13 +1609,17 @@ class solver():
         reveal some starting cells.
             field.reveal(a_good_coordinate)
         
-        To solve a field, you first need to load it (OR A COPY),
+        To solve a field, you first need to load it,
             s.field = field
         and then you call the `solve` method.
             success, difficulty_levels = s.solve()
         
-        NOTICE:  The `solve` method will manipulate the field object,
-        it will literally solve it (or fail to do so).
+        The `solve` method will not touch the field object, it solves
+        a private copy of what is known about it (`s.knowledge`, see
+        `knowledge`) and only peeks at the field when it reveals a
+        cell.  To literally solve the field (with callbacks), set
+            s.mutate_field = True
+        or use `s.knowledge.apply()` afterwards.
         
         If `success` is True, the entire field has been COMPLETELY
         solved without guessing.
@@ -551,6 +1629,14 @@ class solver():
         
         The return values will also be appended as a tuple in
         `s.statistics`.
+        
+        `solve` runs `steps` to the end, use `steps` to follow the
+        solver as it goes or to stop it early.
+            for flagged, revealed, level, elapsed in s.steps():
+                ...
+        
+        `s.solve(record=True)` keeps the steps in `s.trace`, a
+        certificate that can be checked with `replay(field, s.trace)`.
     
     
     measure
@@ -566,7 +1652,7 @@ class solver():
         NOTICE:  The levels do not match the levels of difficulty that
         a neural network would experience.
         
-        NOTICE:  The levels -1 and -2 have special meanings.  And
+        NOTICE:  The levels -1, -2 and -3 have special meanings.  And
         especially -2 does NOT mean "ridiculously" easy.
     
     '''
@@ -578,6 +1664,17 @@ class solver():
             'field',
             'statistics',
             'solve',
+            'mutate_field',
+            'knowledge',
+            'probabilities',
+            'instrument',
+            'counters',
+            'start_pool',
+            'stop_pool',
+            'patterns',
+            'steps',
+            'success',
+            'trace',
         ]
     
     def __hash__(self):
@@ -589,6 +1686,150 @@ class solver():
         '''
         self.field = None
         self.statistics = []
+        # Work on a `knowledge` object instead of the field.
+        self.mutate_field = False
+        self.knowledge = None
+        # The outcome of the last `steps`.
+        self.success = None
+        # Set by `cell_solver`.
+        self.confirmed = None
+        # See `solve`.
+        self.trace = None
+        # Rule 12 is optional.
+        self.linear_tier = False
+        # See `start_pool`.
+        self.pool = None
+        self.pool_threshold = 24
+        # See `conflicts`.
+        self.batch_threshold = 1024
+        # Results kept between the iterations of `solver_loop`, see
+        # `forget`.
+        self.results_cache = {}
+        self.busted_cache = {}
+        self.cache_radius = 3
+        self.cache_flags_left = None
+        # A `pattern_db` shared between fields, or None.
+        self.patterns = None
+        # Used by `probabilities`.
+        self.distribution_cache = {}
+        # The budget of `solve`, see `spend`.
+        self.deadline = None
+        self.max_nodes = None
+        self.nodes = 0
+        self.tick = None
+        # Instrumentation is off, see `instrument`.
+        self.counters = None
+        self.counters_stream = None
+    
+    def instrument(self, enabled=True, stream=None):
+        '''
+        Turn the instrumentation on or off.
+        
+        When on, `self.counters` is a dictionary:
+            'calls'     The number of calls to 'possibilities',
+                        'conflict', 'combinator' and
+                        'bad_consequences'.
+            'nodes'     The number of recursions in
+                        `bad_consequences` for each number of
+                        recursions left (`i`).
+            'time'      The time (seconds) spent on each level of
+                        difficulty, including the special levels.
+            'rule9'     'time' spent in `rule9bf` and the number of
+                        'subsets' (possibilities) it enumerated.
+            'patterns'  The number of `cell_solver` calls answered
+                        by `self.patterns`.
+        
+        If `stream` is not None, each call to `solve` writes the
+        counters as one line of JSON (with 'success' and 'T' added)
+        to `stream` and starts over from zero.
+        
+        When off, `self.counters` is None and every counter is one
+        `is None` test.
+        '''
+        if enabled:
+            self.counters = {
+                'calls': {
+                    'possibilities': 0,
+                    'conflict': 0,
+                    'combinator': 0,
+                    'bad_consequences': 0,
+                },
+                'nodes': {},
+                'time': {},
+                'rule9': {'time': 0.0, 'subsets': 0},
+                'patterns': 0,
+            }
+            self.counters_stream = stream
+        else:
+            self.counters = None
+            self.counters_stream = None
+    
+    def add_time(self, level, seconds):
+        '''(Instrumentation)  Add time to a level of difficulty.'''
+        times = self.counters['time']
+        times[level] = times.get(level, 0.0) + seconds
+    
+    def report(self, success, seconds):
+        '''(Instrumentation)  Write the counters of a finished `solve`.'''
+        if self.counters_stream is None:
+            return
+        line = dict(self.counters)
+        line['success'] = success
+        line['T'] = seconds
+        self.counters_stream.write(json.dumps(line, sort_keys=True) + '\n')
+        self.instrument(True, self.counters_stream)
+    
+    def start_pool(self, workers=None):
+        '''
+        Farm independent components out to a pool of `workers`
+        processes (default: one per CPU).  Used by rule 9,
+        `probabilities` and `sat_solver`.
+        
+        Only components with at least `self.pool_threshold` cells
+        are sent to the pool, and only their sizes and constraints
+        are sent.  There is no budget (see `solve`) in the pool.
+        
+        Does nothing if `concurrent.futures` is unavailable.
+        '''
+        if futures is not None and self.pool is None:
+            self.pool = futures.ProcessPoolExecutor(workers)
+    
+    def stop_pool(self):
+        '''Shut down the pool started by `start_pool`.'''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+    
+    def map_components(self, function, components, *arguments):
+        '''
+        Yield `function(len(cells), constraints, *rest)` for each of
+        the `components`, where `rest` is taken from the lists in
+        `arguments` (one item per component).
+        
+        Large components are submitted to the pool first, the small
+        ones are done right here.  Unfinished jobs are cancelled if
+        the caller stops early.
+        '''
+        jobs = []
+        for index, (cells, constraints) in enumerate(components):
+            rest = [argument[index] for argument in arguments]
+            if self.pool is not None and len(cells) >= self.pool_threshold:
+                job = self.pool.submit(
+                    function, len(cells), constraints, *rest
+                )
+            else:
+                job = None
+            jobs.append((job, len(cells), constraints, rest))
+        try:
+            for job, n, constraints, rest in jobs:
+                if job is None:
+                    yield function(n, constraints, *rest, tick=self.tick)
+                else:
+                    yield job.result()
+        finally:
+            for job, n, constraints, rest in jobs:
+                if job is not None:
+                    job.cancel()
     
     def combinator(self, elements, n):
         '''
@@ -596,6 +1837,8 @@ class solver():
         
         (Each returned combination is a list.)
         '''
+        if self.counters is not None:
+            self.counters['calls']['combinator'] += 1
         n -= 1
         if n:
             combinations = []
@@ -620,6 +1863,37 @@ class solver():
                         neighbours.append(neighbour)
         return neighbours
     
+    def plausible(self, flags, numbers):
+        '''
+        Return False if flagging `flags` and revealing `numbers` (from
+        `pattern_db.recall`) would leave a number neighbour with too
+        many flags or too few free cells for its mines, or if any of
+        them isn't a free cell of the field.  An entry that fails is
+        not used.
+        
+        This doesn't prove that the entry is right, the database must
+        still be trusted.
+        '''
+        flags = set(flags)
+        numbers = set(numbers)
+        if flags & numbers:
+            return False
+        for cell in flags | numbers:
+            if cell is None or self.field.get(cell) is not None:
+                return False
+        for number in self.number_neighbours(list(flags | numbers)):
+            needed = self.field.get(number)
+            free = 0
+            for neighbour in self.field.get_neighbours(number):
+                value = self.field.get(neighbour)
+                if value == 'F' or neighbour in flags:
+                    needed -= 1
+                elif value is None and neighbour not in numbers:
+                    free += 1
+            if not 0 <= needed <= free:
+                return False
+        return True
+    
     def conflict(self, new_flags, exact=False):
         '''
         Check if there is a conflict with the flag count.
@@ -635,6 +1909,8 @@ class solver():
         neighbours.)
         
         '''
+        if self.counters is not None:
+            self.counters['calls']['conflict'] += 1
         # Find number neighbours to all new flags.
         neighbours = self.number_neighbours(new_flags)
         # Iterate over each neighbour.
@@ -656,6 +1932,97 @@ class solver():
         # Hopefully reached.
         return False
     
+    def conflicts(self, parent_possibility, candidates):
+        '''
+        `conflict` for many possibilities at once.
+        
+        Returns a list of booleans, True for each possibility in
+        `candidates` where `self.conflict(parent_possibility + x)`
+        would be True.  The candidates must be lists of free cells that
+        are not in `parent_possibility`.
+        
+        Each number neighbour is turned into a bitmask of the
+        candidate cells around it and the range of how many of them
+        can be flags, so each check is one popcount.  With NumPy and
+        enough work (`self.batch_threshold` checks) all checks are one
+        matrix product of (candidates x cells) and (cells x numbers).
+        '''
+        if self.counters is not None:
+            # One check per candidate.
+            self.counters['calls']['conflict'] += len(candidates)
+        # Index the cells the candidates can flag.
+        local = {}
+        for candidate in candidates:
+            for cell in candidate:
+                if cell not in local:
+                    local[cell] = len(local)
+        parent = set(parent_possibility)
+        # (mask, lowest, highest, touched) for each number neighbour.
+        #   mask        The candidate cells around it.
+        #   lowest      Fewer flags than this in `mask` is a conflict.
+        #   highest     More flags than this in `mask` is a conflict.
+        #   touched     It's a number neighbour to `parent_possibility`
+        #               and always checked.
+        rows = []
+        cells = list(parent_possibility) + list(local)
+        for number in self.number_neighbours(cells):
+            target = self.field.get(number)
+            mask = flag_count = free_count = 0
+            touched = False
+            for maybe_flag in self.field.get_neighbours(number):
+                derefed_maybe_flag = self.field.get(maybe_flag)
+                if maybe_flag in parent:
+                    touched = True
+                    flag_count += 1
+                elif derefed_maybe_flag == 'F':
+                    flag_count += 1
+                if derefed_maybe_flag is None:
+                    free_count += 1
+                if maybe_flag in local:
+                    mask |= 1 << local[maybe_flag]
+            rows.append((
+                mask,
+                target - flag_count - free_count,
+                target - flag_count,
+                touched,
+            ))
+        if not rows:
+            return [False] * len(candidates)
+        
+        if numpy is not None and (
+            len(candidates) * len(rows) >= self.batch_threshold
+        ):
+            flags = numpy.zeros((len(candidates), len(local)), numpy.int32)
+            for index, candidate in enumerate(candidates):
+                for cell in candidate:
+                    flags[index, local[cell]] = 1
+            incidence = numpy.zeros((len(local), len(rows)), numpy.int32)
+            for column, row in enumerate(rows):
+                for cell in range(len(local)):
+                    if row[0] >> cell & 1:
+                        incidence[cell, column] = 1
+            lowest = numpy.array([row[1] for row in rows])
+            highest = numpy.array([row[2] for row in rows])
+            touched = numpy.array([row[3] for row in rows])
+            counts = numpy.dot(flags, incidence)
+            checked = touched | (counts > 0)
+            bad = checked & ((counts < lowest) | (counts > highest))
+            return list(map(bool, bad.any(axis=1)))
+        
+        result = []
+        for candidate in candidates:
+            bits = 0
+            for cell in candidate:
+                bits |= 1 << local[cell]
+            conflict = False
+            for mask, lowest, highest, touched in rows:
+                count = bin(bits & mask).count('1')
+                if (count or touched) and not lowest <= count <= highest:
+                    conflict = True
+                    break
+            result.append(conflict)
+        return result
+    
     def possibilities(self, cell, parent_possibility, count_flags=False):
         '''
         Return a list of combinations of coordinates where the
@@ -667,6 +2034,8 @@ class solver():
         If `count_flags` is True, any possibility with too many mines
         will be eliminated.
         '''
+        if self.counters is not None:
+            self.counters['calls']['possibilities'] += 1
         neighbours = []
         flags = 0
         for neighbour in self.field.get_neighbours(cell):
@@ -691,10 +2060,11 @@ class solver():
         else:
             all_possibilities = [[]]
         # Eliminate direct conflicts.
-        filtered =  list(filter(
-            lambda x: not self.conflict(parent_possibility + x),
-            all_possibilities
-        ))
+        conflicts = self.conflicts(parent_possibility, all_possibilities)
+        filtered = []
+        for possibility, conflict in zip(all_possibilities, conflicts):
+            if not conflict:
+                filtered.append(possibility)
         if count_flags:
             if self.field.flags_left is not None:
                 filtered = list(filter(
@@ -724,6 +2094,12 @@ class solver():
         '''
         if i == 0:
             return False, 0
+        if self.tick is not None:
+            self.tick()
+        if self.counters is not None:
+            self.counters['calls']['bad_consequences'] += 1
+            nodes = self.counters['nodes']
+            nodes[i] = nodes.get(i, 0) + 1
         
         i -= 1
         deepest = i
@@ -766,6 +2142,45 @@ class solver():
                     return True, deepest
         return False, deepest
     
+    def forget(self, cells=None):
+        '''
+        Forget the results kept by `cell_solver` that may depend on
+        `cells` (default: all results), which have been flagged or
+        revealed.
+        
+        A result for a cell depends on the cells within the radius
+        3 + 2*i, where i is the number of recursions.  The results
+        that used the flags left count depend on all flags.
+        '''
+        if cells is None:
+            self.results_cache = {}
+            self.busted_cache = {}
+            return
+        # Revealed zeroes may have revealed their neighbours.
+        changed = set(cells)
+        queue = list(cells)
+        while queue:
+            cell = queue.pop()
+            if self.field.get(cell) == 0:
+                for neighbour in self.field.get_neighbours(cell):
+                    if neighbour not in changed:
+                        changed.add(neighbour)
+                        queue.append(neighbour)
+        # Everything within the radius.
+        area = set(changed)
+        edge = list(changed)
+        for distance in range(self.cache_radius):
+            next_edge = []
+            for cell in edge:
+                for neighbour in self.field.get_neighbours(cell):
+                    if neighbour not in area:
+                        area.add(neighbour)
+                        next_edge.append(neighbour)
+            edge = next_edge
+        for cell in area:
+            self.results_cache.pop(cell, None)
+            self.busted_cache.pop(cell, None)
+    
     def cell_solver(self, cell, difficulty):
         '''
         `cell` is the cell to be solved.
@@ -793,6 +2208,9 @@ class solver():
             'P'         if the cell could be solved at a
                         higher level of difficulty
             'B'         if the cell can't be solved
+        
+        When a cell is solved, `self.confirmed` is (flags, numbers):
+        the cells that were flagged and revealed.
         '''
         # i is the level of recursion
         # j is the mode
@@ -804,13 +2222,64 @@ class solver():
         i = difficulty >> 2
         j = difficulty & 3
         
+        # Windows that have been solved before (see `pattern_db`).
+        # Modes 2 and 3 depend on the flags left count.
+        window = None
+        if self.patterns is not None and not j & 2:
+            window = self.patterns.window(self.field, cell, 3 + 2*i)
+        if window is not None:
+            known = self.patterns.recall(window, difficulty)
+            if known is not None and self.plausible(known[1], known[2]):
+                if self.counters is not None:
+                    self.counters['patterns'] += 1
+                status, flags, numbers = known
+                for flag in flags:
+                    self.field.flag(flag)
+                for number in numbers:
+                    if self.field.get(number) is None:
+                        self.field.reveal(number)
+                if status == 'C':
+                    self.forget(flags + numbers)
+                    self.confirmed = flags, numbers
+                return status
+        
+        # Results from earlier iterations (see `forget`).
+        if self.field.flags_left != self.cache_flags_left:
+            self.cache_flags_left = self.field.flags_left
+            for cached in self.results_cache.values():
+                cached.pop(2, None)
+            for cached in self.busted_cache.values():
+                cached.pop(2, None)
+                cached.pop(3, None)
+        self.cache_radius = max(self.cache_radius, 3 + 2*i)
+        busted = self.busted_cache.setdefault(cell, {})
+        if j in busted and busted[j] <= i:
+            # Nothing has changed since it was busted at a lower level.
+            return 'B'
+        # possibility -> (impossible, depth, i)
+        results = self.results_cache.setdefault(cell, {})
+        results = results.setdefault(j & 2, {})
+        
         # Find possibilities, do the recursions and detect recursion max-outs.
         possibilities = []
         recursion_maxout = True
         for possibility in self.possibilities(cell, []):
-            impossible, depth = self.bad_consequences(
-                cell, possibility, i, j & 2
-            )
+            key = tuple(possibility)
+            cached = results.get(key, (False, 0, None))
+            if cached[2] == i:
+                # Modes 0 and 1 (and 2 and 3) do the same recursions.
+                impossible, depth = cached[:2]
+            elif cached[0] and cached[2] < i:
+                # A possibility that was impossible with fewer
+                # recursions is still impossible, and the depth of the
+                # first level of `bad_consequences` is always i - 1.
+                impossible, depth = True, max(i - 1, 0)
+            else:
+                impossible, depth = self.bad_consequences(
+                    cell, possibility, i, j & 2
+                )
+                if not cached[0]:
+                    results[key] = impossible, depth, i
             if not impossible:
                 possibilities.append(possibility)
             if not depth:
@@ -877,11 +2346,17 @@ class solver():
         
         # Return confirmed/plausible/busted
         if len(flags) + len(numbers):
-            return 'C'
+            self.forget(flags + numbers)
+            self.confirmed = flags, numbers
+            status = 'C'
         elif recursion_maxout:
-            return 'B'
+            busted[j] = i
+            status = 'B'
         else:
-            return 'P'
+            status = 'P'
+        if window is not None:
+            self.patterns.learn(window, difficulty, status, flags, numbers)
+        return status
     
     def unsolved(self, cell):
         '''
@@ -897,17 +2372,13 @@ class solver():
         '''
         This will solve the field according to rules 0 to 7.
         
-        This function returns True if the field was solved.
-        There may still be deserted mines. -- See rule 8.
-        
-        This function returns a boolean that tells if the field was
-        successfully solved and a dictionary for the difficulty levels.
+        This is a generator that yields (flags, numbers, level) for
+        each solved cell:  the cells that were flagged and revealed
+        and the level of difficulty according to rule 6.
         
-        The keys in the dictionary are the levels of difficulty
-        according to rule 6 and their values are the frequencies of the
-        level of difficulty.
-        
-        There may still be deserted mines.  See rules 8 and 9.
+        When it's done, `self.success` is True if the field was
+        solved.  There may still be deserted mines.  See rules 8
+        and 9.
         '''
         def rank_cell(cells, i):
             '''
@@ -922,7 +2393,8 @@ class solver():
             else:
                 return len(more_cells)
         
-        difficulty_levels = {}
+        # The field may have been changed by someone else.
+        self.forget()
         
         while True:
             i = -1      # The increment is in the beginning of the loop
@@ -931,6 +2403,23 @@ class solver():
             confirmed = False
             while not confirmed:
                 i += 1
+                # Rule 12 before the deeper recursions.
+                if i == 2 and self.linear_tier:
+                    if self.counters is not None:
+                        start = time.time()
+                    flags, numbers = self.linear_deductions()
+                    if self.counters is not None:
+                        self.add_time(-3, time.time() - start)
+                    for flag in flags:
+                        self.field.flag(flag)
+                    for number in numbers:
+                        if self.field.get(number) is None:
+                            self.field.reveal(number)
+                    if flags or numbers:
+                        self.forget(flags + numbers)
+                        yield flags, numbers, -3
+                        confirmed = True
+                        continue
                 # As the value of `i` increases, the area of clues
                 # increases too.
                 # Recollect and re-sort the list of unsolved cells.
@@ -941,7 +2430,8 @@ class solver():
                 unsolved_cells.sort(key=lambda x: x[1], reverse=True)
                 # Check for success right here.
                 if not unsolved_cells:
-                    return True, difficulty_levels
+                    self.success = True
+                    return
                 # If nothing succeeds before the j loop finishes,
                 # the function will return False.
                 fail = True
@@ -949,13 +2439,16 @@ class solver():
                     for cell, ignored in unsolved_cells:
                         # It may have been solved already.
                         if self.unsolved(cell):
+                            if self.counters is not None:
+                                start = time.time()
                             status = self.cell_solver(cell, 4*i + j)
+                            if self.counters is not None:
+                                self.add_time(4*i + j, time.time() - start)
                             if status != 'B':
                                 fail = False
                             if status == 'C':
-                                if (4*i + j) not in difficulty_levels:
-                                    difficulty_levels[4*i + j] = 0
-                                difficulty_levels[4*i + j] += 1
+                                flags, numbers = self.confirmed
+                                yield flags, numbers, 4*i + j
                                 confirmed = True
                                 fail = False
                                 break
@@ -963,7 +2456,115 @@ class solver():
                     if confirmed:
                         break
                 if fail:
-                    return False, difficulty_levels
+                    self.success = False
+                    return
+    
+    def frontier(self):
+        '''
+        Split the free cells into independent components and deserted
+        cells.
+        
+        Returns (components, deserted_cells)
+        
+        `components` is a list of (cells, constraints) tuples.  `cells`
+        is a list of free cells that are neighbours to unsolved cells,
+        and `constraints` is a list of (needed, indices) tuples, one
+        for each unsolved cell that is a neighbour to the component.
+        `needed` is the number of flags the unsolved cell is missing
+        and `indices` are the indices in `cells` of its free
+        neighbours.
+        
+        Two free cells are in the same component if they are connected
+        by a chain of unsolved cells (number cells with free
+        neighbours).  Cells in different components share no number
+        constraint and can therefore be enumerated separately.
+        
+        `deserted_cells` is a list of free cells that don't have any
+        number neighbours.
+        '''
+        # Map each free cell to the unsolved cells it is a neighbour of.
+        owners = {}
+        deserted_cells = []
+        for cell in self.field.all_cells():
+            if self.field.get(cell) is not None:
+                continue
+            numbers = self.number_neighbours([cell])
+            if numbers:
+                owners[cell] = numbers
+            else:
+                deserted_cells.append(cell)
+        # Walk each component.
+        components = []
+        visited = set()
+        for seed in owners:
+            if seed in visited:
+                continue
+            visited.add(seed)
+            cells = []
+            numbers = []
+            seen = set()
+            queue = [seed]
+            while queue:
+                cell = queue.pop()
+                cells.append(cell)
+                for number in owners[cell]:
+                    if number in seen:
+                        continue
+                    seen.add(number)
+                    numbers.append(number)
+                    for neighbour in self.field.get_neighbours(number):
+                        if neighbour in owners and neighbour not in visited:
+                            visited.add(neighbour)
+                            queue.append(neighbour)
+            # Describe the constraints of the component.
+            index = dict(zip(cells, range(len(cells))))
+            constraints = []
+            for number in numbers:
+                needed = self.field.get(number)
+                indices = []
+                for neighbour in self.field.get_neighbours(number):
+                    value = self.field.get(neighbour)
+                    if value == 'F':
+                        needed -= 1
+                    elif value is None:
+                        indices.append(index[neighbour])
+                constraints.append((needed, indices))
+            components.append((cells, constraints))
+        return components, deserted_cells
+    
+    def linear_deductions(self):
+        '''
+        Rule 12.
+        
+        Returns (flags, numbers), the cells that must be flagged and
+        the cells that must be revealed.
+        '''
+        components, deserted_cells = self.frontier()
+        if not deserted_cells and self.field.flags_left is not None:
+            # The flags left count binds all components together.
+            all_cells = []
+            all_constraints = []
+            for cells, constraints in components:
+                offset = len(all_cells)
+                all_cells.extend(cells)
+                for needed, indices in constraints:
+                    indices = [index + offset for index in indices]
+                    all_constraints.append((needed, indices))
+            all_constraints.append(
+                (self.field.flags_left, list(range(len(all_cells))))
+            )
+            components = [(all_cells, all_constraints)]
+        flags = []
+        numbers = []
+        for cells, constraints in components:
+            mines, free = linear_consequences(constraints, len(cells))
+            for index in mines:
+                if cells[index] not in flags:
+                    flags.append(cells[index])
+            for index in free:
+                if cells[index] not in numbers:
+                    numbers.append(cells[index])
+        return flags, numbers
     
     def rule9bf(self):
         '''
@@ -1000,67 +2601,58 @@ class solver():
         # Sanity checking.
         if self.field.flags_left is None:
             return False
-        # Find the unsolved cells.
-        unsolved_cells = []
-        for cell in self.field.all_cells():
-            if self.unsolved(cell):
-                unsolved_cells.append(cell)
-        # Find the cells to be brute-forced.
+        # Find the cells to be brute-forced, split into independent
+        # components.
         # They are free cells that are neighbours to the unsolved cells.
         # ### AND
         # Find the deserted cells.
         # As per definition: free cells that are not neighbours to
         # unsolved cells.
-        bruteforce_cells = []
-        deserted_cells = []
-        for cell in self.field.all_cells():
-            if self.field.get(cell) is None:
-                for unsolved_cell in unsolved_cells:
-                    if cell in self.field.get_neighbours(unsolved_cell):
-                        bruteforce_cells.append(cell)
-                        break # Fix another bug as well. # 0.0.25
-                else:
-                    # 0.0.25
-                    # The BUG WAS here. The 'else' statement belonged to the
-                    # 'if' statement rather than to the 'for' statement.
-                    # Check the comment at the top of this function.
-                    deserted_cells.append(cell)
+        components, deserted_cells = self.frontier()
         
         # Check that there are deserted cells. (Late sanity checking)
         if not len(deserted_cells):
             return False
         
-        # Begin brute-forcing.
-        lowest = None
-        L = len(bruteforce_cells)
-        # 1 <= n <= 2^L - 2
-        # The real ends (0, 2^L - 1) are either impossible or obvious.
-        n = 1
-        stop = (1 << L) - 1
         # Check if it is even possible for any possibility to exist.
+        L = 0
+        for cells, constraints in components:
+            L += len(cells)
         if L - 1 < self.field.flags_left:
             return False
-        while n < stop:
-            # Assemble mines and numbers.
-            possibility = []
-            for i in range(L):
-                if n & (1 << i):
-                    possibility.append(bruteforce_cells[i])
-            # Check if the possibility is possible.
-            if not self.conflict(possibility, True):
-                # Keep track of the min() value of all possibilities
-                # in REAL TIME
-                if lowest is None or len(possibility) < lowest:
-                    lowest = len(possibility)
-                    if lowest < self.field.flags_left:
-                        # One/some of the deserted cells could be a mine.
-                        return False
-            # Next possibility:
-            n += 1
+        
+        # Begin brute-forcing, one component at a time.
+        # A possibility only needs to satisfy the number cells next to
+        # its own mines, so the other components can always be left
+        # empty.  The lowest possible number of mines is therefore the
+        # lowest of the components, not their sum.
+        # The real ends (no mines at all and every brute-forced cell
+        # being a mine) are either impossible or obvious, the latter is
+        # only the case for a component that is the entire list.
+        lowest = None
+        results = self.map_components(
+            possibility_bounds,
+            components,
+            [len(components) > 1] * len(components),
+            [self.field.flags_left] * len(components)
+        )
+        for lowest_here, highest_here, subsets in results:
+            if self.counters is not None:
+                self.counters['rule9']['subsets'] += subsets
+            if lowest_here is None:
+                continue
+            if lowest is None or lowest_here < lowest:
+                lowest = lowest_here
+                if lowest < self.field.flags_left:
+                    # One/some of the deserted cells could be a mine.
+                    results.close()
+                    return False
         
         # Verifying that no possibility could allow mines among the
         # deserted cells, after brute forcing, was way too slow.
         
+        if lowest is None:
+            return False
         assert lowest == self.field.flags_left
         
         # There is a chance if the function hasn't returned yet.
@@ -1068,7 +2660,264 @@ class solver():
             self.field.reveal(deserted_cell)
         return True
     
-    def solve(self):
+    def component_bounds(self, component, include_all, stop_below=None):
+        '''
+        Return (lowest, highest): the lowest and highest number of
+        mines of the non-empty possibilities for `component` (see
+        `frontier`).  (None, None) if there are no possibilities.
+        
+        A possibility is a subset of the cells of `component` that
+        doesn't make any number neighbour of its mines conflict (rules
+        1 and 3).  The possibility where every cell is a mine is only
+        included if `include_all` is True.
+        
+        If `stop_below` is not None, the function will return as soon
+        as a possibility with fewer mines than `stop_below` has been
+        found.  `highest` is unreliable in that case.
+        '''
+        cells, constraints = component
+        lowest, highest, subsets = possibility_bounds(
+            len(cells), constraints, include_all, stop_below, self.tick
+        )
+        if self.counters is not None:
+            self.counters['rule9']['subsets'] += subsets
+        return lowest, highest
+    
+    def component_distribution(self, component):
+        '''
+        Return (ways, counts) for `component` (see `frontier`).
+        
+        `ways[m]` is the number of possibilities with `m` mines and
+        `counts[m][i]` is the number of those that have a mine on the
+        cell at index `i`.  Unlike rule 9, every constraint must be
+        satisfied exactly.
+        
+        The results are cached on the constraints of the component,
+        which don't change until something is revealed or flagged
+        near it.
+        '''
+        cells, constraints = component
+        L = len(cells)
+        key = self.distribution_key(component)
+        if key in self.distribution_cache:
+            return self.distribution_cache[key]
+        ways, counts = possibility_distribution(L, constraints)
+        self.cache_distribution(key, ways, counts)
+        return ways, counts
+    
+    def distribution_key(self, component):
+        '''The key of `component` in `self.distribution_cache`.'''
+        cells, constraints = component
+        return (len(cells), tuple([
+            (needed, tuple(indices)) for needed, indices in constraints
+        ]))
+    
+    def cache_distribution(self, key, ways, counts):
+        '''Store a result of `possibility_distribution`.'''
+        if len(self.distribution_cache) > 4096:
+            self.distribution_cache.clear()
+        self.distribution_cache[key] = ways, counts
+    
+    def probabilities(self):
+        '''
+        Return a dictionary of the exact mine probability (a
+        `fractions.Fraction`) of every free cell, or None if the
+        flags on the field can't be right.
+        
+        Every arrangement of the remaining mines that agrees with the
+        numbers is equally likely.  Each component (see `frontier`)
+        is enumerated on its own, and a total of `s` mines in the
+        components is weighted by the number of ways to place the
+        other `flags_left - s` mines in the deserted cells.
+        
+        If the field has no flag count, the components are
+        independent and the deserted cells are None.
+        '''
+        components, deserted_cells = self.frontier()
+        # Enumerate the components that aren't cached.
+        keys = [self.distribution_key(component) for component in components]
+        missing = []
+        for key, component in zip(keys, components):
+            if key not in self.distribution_cache:
+                missing.append((key, component))
+        results = self.map_components(
+            possibility_distribution,
+            [component for key, component in missing]
+        )
+        for (key, component), (ways, counts) in zip(missing, results):
+            self.cache_distribution(key, ways, counts)
+        distributions = []
+        for key in keys:
+            ways, counts = self.distribution_cache[key]
+            if not any(ways):
+                return None
+            distributions.append((ways, counts))
+        probabilities = {}
+        flags_left = self.field.flags_left
+        if flags_left is None:
+            for (cells, constraints), (ways, counts) in zip(
+                components, distributions
+            ):
+                total = sum(ways)
+                for index, cell in enumerate(cells):
+                    mines = sum([row[index] for row in counts])
+                    probabilities[cell] = fractions.Fraction(mines, total)
+            for cell in deserted_cells:
+                probabilities[cell] = None
+            return probabilities
+        
+        D = len(deserted_cells)
+        # prefix[k] and suffix[k] are the distributions of the number
+        # of mines in the components before and from k.
+        prefix = [[1]]
+        for ways, counts in distributions:
+            prefix.append(convolve(prefix[-1], ways))
+        suffix = [[1]]
+        for ways, counts in reversed(distributions):
+            suffix.insert(0, convolve(suffix[0], ways))
+        # weight[s]: The number of ways to place the rest of the mines
+        # if the components have `s` mines.
+        weight = []
+        for mines in range(len(prefix[-1])):
+            weight.append(binomial(D, flags_left - mines))
+        total = 0
+        deserted_mines = 0
+        for mines, ways in enumerate(prefix[-1]):
+            total += ways * weight[mines]
+            deserted_mines += ways * weight[mines] * (flags_left - mines)
+        if not total:
+            return None
+        for k, (cells, constraints) in enumerate(components):
+            ways, counts = distributions[k]
+            others = convolve(prefix[k], suffix[k + 1])
+            weights = []
+            for mines in range(len(ways)):
+                weights.append(sum([
+                    x * weight[mines + s] for s, x in enumerate(others)
+                ]))
+            for index, cell in enumerate(cells):
+                probabilities[cell] = fractions.Fraction(
+                    sum([
+                        counts[mines][index] * weights[mines]
+                        for mines in range(len(ways))
+                    ]),
+                    total
+                )
+        for cell in deserted_cells:
+            probabilities[cell] = fractions.Fraction(deserted_mines, D * total)
+        return probabilities
+    
+    def spend(self):
+        '''
+        Count one node of the search and raise `gave_up` if the budget
+        given to `solve` has been spent.
+        '''
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise gave_up()
+        if self.deadline is not None and not self.nodes % 16:
+            if time.time() > self.deadline:
+                raise gave_up()
+    
+    def steps(self, deadline=None, max_nodes=None):
+        '''
+        Solve the field one deduction at a time.
+        
+        This is a generator that yields (flagged, revealed, level,
+        elapsed) for each deduction:  the cells that were flagged and
+        the cells that were revealed (revealed zeroes reveal their
+        neighbours like on the field), the level of difficulty and the
+        time (seconds) since the start.  Rules 8 and 9 are steps when
+        they are tried, even if they fail (without cells).
+        
+        When it's exhausted, `self.success` is the `success` of
+        `solve`.  It may be closed or dropped at any time, until then
+        `self.field` is the `knowledge` object (unless
+        `self.mutate_field` is True) and the solver is busy.
+        
+        `deadline` and `max_nodes`:  See `solve`.
+        '''
+        start_time = time.time()
+        self.success = None
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        if deadline is None and max_nodes is None:
+            self.tick = None
+        else:
+            self.tick = self.spend
+        field = self.field
+        if not self.mutate_field:
+            self.knowledge = knowledge(field)
+            self.field = self.knowledge
+        try:
+            for flagged, revealed, level in self.deduce():
+                yield flagged, revealed, level, time.time() - start_time
+        except gave_up:
+            self.success = None
+        finally:
+            self.field = field
+            self.tick = None
+    
+    def deduce(self):
+        '''
+        The deductions of `steps`, a generator of (flagged, revealed,
+        level).  Sets `self.success` when it's done.
+        '''
+        while True:
+            # Use the ordinary solver loop at first.
+            for step in self.solver_loop():
+                yield step
+            success = self.success
+            # Use rules 8 and 9 if necessary.
+            if self.field.flags_left is None:
+                break
+            # Find deserted cells.
+            deserted_cells = []
+            for cell in self.field.all_cells():
+                if self.field.get(cell) is None:
+                    deserted_cells.append(cell)
+            if success:
+                # Rule 8.
+                if len(deserted_cells):
+                    if len(deserted_cells) == self.field.flags_left:
+                        # All are mines.
+                        for cell in deserted_cells:
+                            self.field.flag(cell)
+                        yield deserted_cells, [], -1
+                    elif self.field.flags_left == 0:
+                        # None are mines.
+                        for cell in deserted_cells:
+                            self.field.reveal(cell)
+                        yield [], deserted_cells, -1
+                    else:
+                        success = False
+                        yield [], [], -1
+                break
+            elif deserted_cells:
+                # Rule 9
+                if self.counters is not None:
+                    start = time.time()
+                solvable = self.rule9bf()
+                if self.counters is not None:
+                    seconds = time.time() - start
+                    self.add_time(-2, seconds)
+                    self.counters['rule9']['time'] += seconds
+                revealed = list(filter(
+                    lambda x: self.field.get(x) is not None,
+                    deserted_cells
+                ))
+                yield [], revealed, -2
+                if not solvable:
+                    success = False
+                    break
+            else:
+                # Rare, but possible case.
+                success = False
+                break
+        self.success = success
+    
+    def solve(self, deadline=None, max_nodes=None, record=False):
         '''
         NOTE to self:  This is copy-pasted.
         
@@ -1084,13 +2933,17 @@ class solver():
         reveal some starting cells.
             field.reveal(a_good_coordinate)
         
-        To solve a field, you first need to load it (OR A COPY),
+        To solve a field, you first need to load it,
             s.field = field
         and then you call the `solve` method.
             success, difficulty_levels = s.solve()
         
-        NOTICE:  The `solve` method will manipulate the field object,
-        it will literally solve it (or fail to do so).
+        The `solve` method will not touch the field object, it solves
+        a private copy of what is known about it (`s.knowledge`, see
+        `knowledge`) and only peeks at the field when it reveals a
+        cell.  To literally solve the field (with callbacks), set
+            s.mutate_field = True
+        or use `s.knowledge.apply()` afterwards.
         
         If `success` is True, the entire field has been COMPLETELY
         solved without guessing.
@@ -1101,63 +2954,158 @@ class solver():
         The return values will also be appended as a tuple in
         `s.statistics`.
         
+        `deadline` (a `time.time()` value) and `max_nodes` (the number
+        of recursions and brute-force nodes) limit how long the solver
+        may try.  If either is reached, `success` is None and the
+        field has been partially solved.
+        
+        `solve` runs `steps` to the end, use `steps` to follow the
+        solver as it goes or to stop it early.
+        
+        If `record` is True, `s.trace` will be a list of
+        (level, flagged, revealed) for each step, which can be
+        verified with `replay` without solving the field again.
+        Otherwise `s.trace` is None.
+        
         
         NOTE to self:  This is copy-pasted.
         '''
-        
         start_time = time.time()
-        
         difficulty_levels = {}
-        done = False
-        while not done:
-            # Use the ordinary solver loop at first.
-            success, update_difficulty = self.solver_loop()
-            # Use rules 8 and 9 if necessary.
-            if self.field.flags_left is None:
-                done = True
-            else:
-                # Find deserted cells.
-                deserted_cells = []
-                for cell in self.field.all_cells():
-                    if self.field.get(cell) is None:
-                        deserted_cells.append(cell)
-                if success:
-                    # Rule 8.
-                    if len(deserted_cells):
-                        update_difficulty[-1] = 1   # Key -1 has not been used.
-                        if len(deserted_cells) == self.field.flags_left:
-                            # All are mines.
-                            for cell in deserted_cells:
-                                self.field.flag(cell)
-                        elif self.field.flags_left == 0:
-                            # None are mines.
-                            for cell in deserted_cells:
-                                self.field.reveal(cell)
-                        else:
-                            success = False
-                    done = True
-                elif deserted_cells:
-                    # Rule 9
-                    update_difficulty[-2] = 1       # Key -2 has not been used.
-                    if not self.rule9bf():
-                        success = False
-                        done = True
-                else:
-                    # Rare, but possible case.
-                    success = False
-                    done = True
-            # Update the difficulty levels.
-            for key in update_difficulty:
-                if key in difficulty_levels:
-                    difficulty_levels[key] += update_difficulty[key]
-                else:
-                    difficulty_levels[key] = update_difficulty[key]
+        if record:
+            self.trace = []
+        else:
+            self.trace = None
+        for flagged, revealed, level, ignored in self.steps(
+            deadline, max_nodes
+        ):
+            if level is not None:
+                difficulty_levels[level] = difficulty_levels.get(level, 0) + 1
+            if record:
+                self.trace.append((level, list(flagged), list(revealed)))
+        success = self.success
         # Done.
         difficulty_levels['T'] = time.time() - start_time
+        if self.counters is not None:
+            self.report(success, difficulty_levels['T'])
         ret = success, difficulty_levels
         self.statistics.append(ret)
         return ret
 
+class sat_solver(solver):
+    '''
+    A solver that only answers the question whether a field can be
+    solved without guessing.
+    
+    It is used exactly like `solver`,
+        s = anonymine_solver.sat_solver()
+        s.field = field
+        success, difficulty_levels = s.solve()
+    but `difficulty_levels` only contains the time ('T') and the
+    levels yielded by `steps` are None.
+    
+    Instead of the rules, each component (see `solver.frontier`) is
+    handed to a DPLL search with unit propagation (`satisfy`).  A
+    cell is safe to flag or reveal if the component has no
+    possibility where it has the other value.  One possibility (a
+    witness) is found first, each cell is then tested against its
+    value in the witness, and every new possibility found on the way
+    clears the cells where it differs from the witness.
+    
+    When no component gives anything, the flags left count is taken
+    into account:  the number of mines in a component must leave
+    room for the lowest number of mines in the other components and
+    must not need more than the deserted cells can take.
+    
+    This is at least as strong as rules 0 to 9, so a field solvable
+    by `solver` is also solvable by `sat_solver`, but not the other
+    way around.
+    '''
+    def forced(self, component, mines_range=None):
+        '''
+        Return (mines, numbers), the indices of the cells of
+        `component` that have the same value in every possibility,
+        or None if there are no possibilities.
+        '''
+        cells, constraints = component
+        return forced_values(len(cells), constraints, mines_range, self.tick)
+    
+    def mine_bounds(self, component):
+        '''
+        Return (lowest, highest): the lowest and highest number of
+        mines among the possibilities of `component`.
+        '''
+        cells, constraints = component
+        return mines_bounds(len(cells), constraints, self.tick)
+    
+    def deductions(self):
+        '''
+        Return (flags, numbers), the cells that must be flagged and
+        the cells that must be revealed.
+        '''
+        components, deserted_cells = self.frontier()
+        flags = []
+        numbers = []
+        def add(cells, result):
+            mines, free = result
+            for index in mines:
+                flags.append(cells[index])
+            for index in free:
+                numbers.append(cells[index])
+        results = self.map_components(forced_values, components)
+        for component, result in zip(components, results):
+            assert result is not None, "Impossible field"
+            add(component[0], result)
+        if flags or numbers or self.field.flags_left is None:
+            return flags, numbers
+        # Use the flags left count.
+        flags_left = self.field.flags_left
+        bounds = list(self.map_components(mines_bounds, components))
+        lowest = sum([bound[0] for bound in bounds])
+        highest = sum([bound[1] for bound in bounds])
+        limited = []
+        ranges = []
+        for component, bound in zip(components, bounds):
+            mines_range = (
+                flags_left - len(deserted_cells) - (highest - bound[1]),
+                flags_left - (lowest - bound[0]),
+            )
+            if mines_range[0] <= bound[0] and bound[1] <= mines_range[1]:
+                continue
+            limited.append(component)
+            ranges.append(mines_range)
+        results = self.map_components(forced_values, limited, ranges)
+        for component, result in zip(limited, results):
+            add(component[0], result)
+        if deserted_cells:
+            if flags_left - lowest <= 0:
+                numbers.extend(deserted_cells)
+            elif flags_left - highest >= len(deserted_cells):
+                flags.extend(deserted_cells)
+        return flags, numbers
+    
+    def deduce(self):
+        '''
+        See `solver.deduce`.  The levels are None.
+        '''
+        while True:
+            flags, numbers = self.deductions()
+            if not (flags or numbers):
+                break
+            for cell in flags:
+                self.field.flag(cell)
+            for cell in numbers:
+                if self.field.get(cell) is None:
+                    self.field.reveal(cell)
+            yield flags, numbers, None
+        success = True
+        for cell in self.field.all_cells():
+            if self.field.get(cell) is None:
+                success = False
+                break
+        self.success = success
+
+
 import os
 import sys
 assert __name__ != '__main__', "I'm not a script."
@@ -20,6 +20,7 @@ import sys
 import anonymine_fields
 import anonymine_solver
 import anonymine_engine
+import anonymine_rng
 import random
 import signal
 import pprint
@@ -36,6 +37,7 @@ def pypybug():
     field = anonymine_fields.generic_field(size, True, True)
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     field.fill(mines)
     field.reveal(start)
     field.set_callback('input', output, None)
@@ -58,6 +60,7 @@ def slomobug():
     field = anonymine_fields.generic_field([30, 16], True, True)
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     field.fill(mines)
     field.reveal(start)
     field.set_callback('input', output, None)
@@ -82,6 +85,7 @@ def runmoore(x=78, y=18, m=225):
     
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     
     print(solver.solve())
 
@@ -112,6 +116,7 @@ def run623():
     
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     ret = solver.solve()
     if ret[0]:
         print(field.field)
@@ -135,6 +140,7 @@ def runneumann(x=78, y=18, m=225):
     
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     print(solver.solve())
 
 def runhex(x=39, y=18, m=112):
@@ -155,6 +161,7 @@ def runhex(x=39, y=18, m=112):
     
     solver = anonymine_solver.solver()
     solver.field = field
+    solver.mutate_field = True   # Solve the field itself.
     print(solver.solve())
 
 
@@ -292,3 +299,340 @@ def run3(path):
     
     f.write(pprint.pformat({'times': times, 'data': data}))
     f.close()
+
+def random_field(field, n_mines, start=None):
+    '''
+    Clear `field`, place `n_mines` random mines outside the
+    neighbourhood of `start` (a random cell if None) and reveal
+    `start`, the way `game_engine.init_field2` does.
+    
+    Returns (start, mines).
+    '''
+    if start is None:
+        start = tuple(random.randint(0, n - 1) for n in field.dimensions)
+    safe = field.get_neighbours(start) + [start]
+    cells = list(filter(lambda x: x not in safe, field.all_cells()))
+    random.shuffle(cells)
+    field.clear()
+    field.fill(cells[:n_mines])
+    field.reveal(start)
+    return start, cells[:n_mines]
+
+def attempts(width, height, density, backend='rules', seconds=10.0):
+    '''
+    Test random fields the way `game_engine.init_field2` does for
+    `seconds` seconds with the solver backend `backend` ('rules' or
+    'sat').
+    
+    Returns (attempts per second, solvable fields per second).
+    '''
+    if backend == 'sat':
+        solver = anonymine_solver.sat_solver()
+    else:
+        solver = anonymine_solver.solver()
+    field = anonymine_fields.generic_field([width, height])
+    solver.field = field
+    n_mines = int(density * width * height + 0.5)
+    start = None
+    
+    i = 0
+    success = 0
+    starttime = time.time()
+    while time.time() - starttime < seconds:
+        i += 1
+        start, mines = random_field(field, n_mines, start)
+        success += solver.solve()[0]
+    elapsed = time.time() - starttime
+    sys.stderr.write('{}@{}x{} {}:\t{:.1f} attempts/s\t{:.2f} solved/s\n'.format(
+        n_mines, width, height, backend, i/elapsed, success/elapsed
+    ))
+    return i/elapsed, success/elapsed
+
+def run4(width=16, height=16, seconds=60.0):
+    data = {}
+    for density in (.20, .25):
+        for backend in ('rules', 'sat'):
+            key = '{}% {}'.format(int(100 * density), backend)
+            data[key] = attempts(width, height, density, backend, seconds)
+    pprint.pprint(data)
+    return data
+
+def rejects(width, height, density, runs=200, backend='rules'):
+    '''
+    Count how many random fields each of the reject filters throws
+    away and how much solver time that saves.
+    
+    The rejected fields are solved anyway to measure the time, a
+    rejected field that gets solved would be a bug in the filter.
+    '''
+    if backend == 'sat':
+        solver = anonymine_solver.sat_solver()
+    else:
+        solver = anonymine_solver.solver()
+    field = anonymine_fields.generic_field([width, height])
+    solver.field = field
+    n_mines = int(density * width * height + 0.5)
+    start = None
+    
+    counts = {}
+    saved = {}
+    filter_time = 0.0
+    for i in range(runs):
+        start, mines = random_field(field, n_mines, start)
+        mines = set(mines)
+        starttime = time.time()
+        for name, reject in anonymine_solver.reject_filters:
+            if reject(field, mines):
+                break
+        else:
+            name = None
+        filter_time += time.time() - starttime
+        if name is None:
+            continue
+        starttime = time.time()
+        assert not solver.solve()[0], 'Bad filter: ' + name
+        counts[name] = counts.get(name, 0) + 1
+        saved[name] = saved.get(name, 0.0) + time.time() - starttime
+    data = {
+        'rejected': counts,
+        'solver time saved': saved,
+        'filter time': filter_time,
+    }
+    sys.stderr.write('{}@{}x{}: {}\n'.format(
+        n_mines, width, height, pprint.pformat(data)
+    ))
+    return data
+
+def rule_times(width, height, density, runs=50):
+    '''
+    Use the solver instrumentation to find out where the time goes
+    when generating fields at `density`.
+    
+    Returns the summed counters of `runs` random fields.
+    '''
+    solver = anonymine_solver.solver()
+    field = anonymine_fields.generic_field([width, height])
+    solver.field = field
+    n_mines = int(density * width * height + 0.5)
+    start = None
+    
+    total = {'calls': {}, 'nodes': {}, 'time': {}, 'rule9': {}}
+    for i in range(runs):
+        start, mines = random_field(field, n_mines, start)
+        solver.instrument()
+        solver.solve()
+        for group in total:
+            for key in solver.counters[group]:
+                value = solver.counters[group][key]
+                total[group][key] = total[group].get(key, 0) + value
+    solver.instrument(False)
+    sys.stderr.write('{}@{}x{}: {}\n'.format(
+        n_mines, width, height, pprint.pformat(total)
+    ))
+    return total
+
+def parallel(width=200, height=200, density=.2, workers=None):
+    '''
+    Compare the sat backend with and without a process pool on one
+    large random field.  Returns the times.
+    '''
+    field = anonymine_fields.generic_field([width, height])
+    n_mines = int(density * width * height + 0.5)
+    random_field(field, n_mines, (width//2, height//2))
+    times = {}
+    for pool in (False, True):
+        solver = anonymine_solver.sat_solver()
+        solver.field = field
+        if pool:
+            solver.start_pool(workers)
+        starttime = time.time()
+        success = solver.solve()[0]
+        times[pool] = time.time() - starttime
+        solver.stop_pool()
+        sys.stderr.write('pool={}: {} {}\n'.format(pool, success, times[pool]))
+    return times
+
+def patterns(path, width=16, height=16, density=.16, runs=50):
+    '''
+    Solve `runs` random fields without and with the pattern database
+    in the directory `path`, which is updated.  Returns the times and
+    the number of `cell_solver` calls that were answered by the
+    database.
+    '''
+    field = anonymine_fields.generic_field([width, height])
+    n_mines = int(density * width * height + 0.5)
+    db = anonymine_engine.load_patterns(path)
+    times = {False: 0.0, True: 0.0}
+    hits = 0
+    for i in range(runs):
+        start, mines = random_field(field, n_mines)
+        for use_db in (False, True):
+            if use_db:
+                field.clear()
+                field.fill(mines)
+                field.reveal(start)
+            solver = anonymine_solver.solver()
+            solver.field = field
+            if use_db:
+                solver.patterns = db
+                solver.instrument()
+            starttime = time.time()
+            solver.solve()
+            times[use_db] += time.time() - starttime
+            if use_db:
+                hits += solver.counters['patterns']
+    anonymine_engine.save_patterns(db, path)
+    sys.stderr.write('{} entries, {} hits, {}\n'.format(
+        len(db.entries), hits, times
+    ))
+    return times, hits
+
+def runsteps(x=78, y=18, m=225):
+    '''
+    Like `runmoore`, but the field is solved by the demo, one
+    `solver.steps` deduction at a time.
+    '''
+    field = anonymine_fields.generic_field([x, y])
+    random_field(field, m)
+    solver = anonymine_solver.solver()
+    solver.field = field
+    for flagged, revealed, level, elapsed in solver.steps():
+        for cell in flagged:
+            field.flag(cell)
+        for cell in revealed:
+            if field.get(cell) is None:
+                field.reveal(cell)
+        print(field)
+        print('Level {}, {:.3f} s'.format(level, elapsed))
+        time.sleep(.04)
+    print(solver.success)
+
+def certify(width=16, height=16, density=.16, runs=50):
+    '''
+    Record traces of `runs` random fields and compare the time it
+    takes to solve them with the time it takes to `replay` them.
+    '''
+    field = anonymine_fields.generic_field([width, height])
+    n_mines = int(density * width * height + 0.5)
+    solver = anonymine_solver.solver()
+    solver.field = field
+    times = {'solve': 0.0, 'replay': 0.0}
+    for i in range(runs):
+        random_field(field, n_mines)
+        starttime = time.time()
+        success = solver.solve(record=True)[0]
+        times['solve'] += time.time() - starttime
+        starttime = time.time()
+        valid = anonymine_solver.replay(field, solver.trace)
+        times['replay'] += time.time() - starttime
+        assert valid == bool(success)
+    sys.stderr.write('{}\n'.format(times))
+    return times
+
+def scan(width=16, height=16, density=.16, runs=10):
+    '''
+    Compare `anonymine_engine.guessless_mines` (one startpoint) with
+    `anonymine_engine.scan_mines` (every opening): time per field and
+    the share of the cells a field can be started from.
+    '''
+    cfg = {'init-field': {}}
+    field = anonymine_engine.new_field((width, height), 'moore')
+    n_mines = int(density * width * height + 0.5)
+    solver = anonymine_solver.solver()
+    times = {'single': 0.0, 'scan': 0.0}
+    coverage = 0.0
+    for i in range(runs):
+        start = random.randint(0, width - 1), random.randint(0, height - 1)
+        starttime = time.time()
+        anonymine_engine.guessless_mines(field, solver, n_mines, start, cfg)
+        times['single'] += time.time() - starttime
+        starttime = time.time()
+        mines, startpoints, rejections = anonymine_engine.scan_mines(
+            field, solver, n_mines, cfg
+        )
+        times['scan'] += time.time() - starttime
+        coverage += float(len(startpoints)) / (width * height)
+    sys.stderr.write('{0} startpoints: {1:.1%}\n'.format(
+        times, coverage / runs
+    ))
+    return times, coverage / runs
+
+def repair(width=16, height=16, seconds=120, densities=(.15, .20, .25, .30)):
+    '''
+    Compare the time it takes to make a solvable field by rejecting
+    random fields (`anonymine_engine.guessless_mines`) with moving
+    mines where the solver got stuck (`anonymine_engine.repair_mines`).
+    
+    Each strategy gets `seconds` (int) for each density.
+    
+    Returns {(density, strategy): seconds per field or None}.
+    '''
+    class out_of_time(Exception):
+        pass
+    def handler(foo, bar):
+        raise out_of_time()
+    signal.signal(signal.SIGALRM, handler)
+    field = anonymine_engine.new_field((width, height), 'moore')
+    start = width // 2, height // 2
+    data = {}
+    for density in densities:
+        n_mines = int(density * width * height + 0.5)
+        for strategy in ('reject', 'repair'):
+            cfg = {'init-field': {'strategy': strategy}}
+            solver = anonymine_solver.solver()
+            fields = 0
+            starttime = time.time()
+            signal.alarm(seconds)
+            try:
+                while True:
+                    anonymine_engine.guessless_mines(
+                        field, solver, n_mines, start, cfg
+                    )
+                    fields += 1
+            except out_of_time:
+                pass
+            elapsed = time.time() - starttime
+            if fields:
+                data[(density, strategy)] = elapsed / fields
+            else:
+                data[(density, strategy)] = None
+            sys.stderr.write('{}@{}x{} {}:\t{} fields in {:.0f} s\n'.format(
+                n_mines, width, height, strategy, fields, elapsed
+            ))
+    signal.signal(signal.SIGALRM, signal.SIG_DFL)
+    return data
+
+def placement(width=200, height=200, density=.2, runs=20):
+    '''
+    Time the old mine placement (sorting the cells with os.urandom)
+    and `anonymine_rng.sample`, and check that a guessless field made
+    by a stream can be made again from its origin.
+    '''
+    field = anonymine_engine.new_field((width, height), 'moore')
+    cells = field.all_cells()
+    n_mines = int(density * width * height + 0.5)
+    starttime = time.time()
+    for run in range(runs):
+        cells.sort(key=lambda x: os.urandom(1))
+        mines = cells[:n_mines]
+    old = (time.time() - starttime) / runs
+    stream = anonymine_rng.stream(anonymine_rng.new_seed(), 0)
+    starttime = time.time()
+    for run in range(runs):
+        mines = anonymine_rng.sample(stream.next(), cells, n_mines)
+    new = (time.time() - starttime) / runs
+    sys.stderr.write('{}@{}x{}: {:.4f} s sorted, {:.4f} s sampled\n'.format(
+        n_mines, width, height, old, new
+    ))
+    field = anonymine_engine.new_field((16, 16), 'moore')
+    cfg = {'init-field': {}}
+    start = (8, 8)
+    stream = anonymine_rng.stream(anonymine_rng.new_seed(), 3)
+    mines, rejections = anonymine_engine.guessless_mines(
+        field, anonymine_solver.solver(), 40, start, cfg, stream
+    )
+    again = anonymine_engine.regenerate_mines(
+        field, None, 40, start, cfg, stream.origin()
+    )
+    assert mines == again
+    return old, new